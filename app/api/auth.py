@@ -0,0 +1,43 @@
+# app/api/auth.py
+
+from datetime import timedelta
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import OAuth2PasswordRequestForm
+from app import auth
+
+router = APIRouter()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Exchange username and password for a bearer token
+# ─────────────────────────────────────────────────────────────────────────────
+@router.post("/login", response_model=auth.Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    """
+    Exchange username and password for a bearer token (OAuth2 password flow).
+
+    The bcrypt check runs in the thread pool so it does not block the
+    event loop for other requests. The response uses the standard OAuth2
+    token format, which Swagger UI's Authorize button expects.
+
+    Parameters:
+        form_data (OAuth2PasswordRequestForm): Form fields username and password.
+
+    Returns:
+        Token: access_token and token_type.
+
+    Raises:
+        HTTPException: 401 if the credentials are invalid.
+    """
+    if not await run_in_threadpool(auth.authenticate_user, form_data.username, form_data.password):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    access_token = auth.create_access_token(
+        {"sub": form_data.username}, expires_delta=timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return auth.Token(access_token=access_token)
@@ -1,18 +1,331 @@
 # app/api/tree.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi import status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from typing import Literal, Optional
+from app.database import get_db, get_read_db, prefers_primary, read_session
 from app import crud, schemas
 from app.models import TreeNode
+import asyncio
+import hashlib
+import json
 import logging
+import os
 from app.exceptions import InvalidParentIDException, NodeNotFoundException
-from app.utils import build_tree, find_subtree_by_id
+from app.utils import CompactTree, build_tree, encode_ndjson, encode_nested_json, encode_tree_json
+from app.cache import tree_cache
+from app.metrics import SINGLEFLIGHT_COALESCED, SINGLEFLIGHT_LOADS, record_tree_size, stage
+from app.invalidation import tree_version_listener
+from app.snapshot import snapshot_store
+
+try:
+    import orjson
+except ImportError:  # optional; only needed for TREE_JSON_ENCODER=orjson
+    orjson = None
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Opt-in fast encoder for tree responses: "orjson" or "builtin" (default)
+TREE_JSON_ENCODER = os.getenv("TREE_JSON_ENCODER", "builtin")
+if TREE_JSON_ENCODER == "orjson" and orjson is None:
+    logger.warning("TREE_JSON_ENCODER=orjson but orjson is not installed; using the builtin encoder")
+USE_ORJSON = TREE_JSON_ENCODER == "orjson" and orjson is not None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Single-flight: concurrent cache misses for the same key share one load
+# ─────────────────────────────────────────────────────────────────────────────
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one in-flight task.
+
+    The first caller for a key starts the load; callers arriving while it
+    runs await the same task instead of repeating the query and build.
+    Keys include the tree cache version, so a request that arrives after a
+    write never joins a load that started before it.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, load):
+        """
+        Run load() for key, or join the run already in flight.
+
+        Parameters:
+            key (Hashable): Identifies the load; the first element names it in metrics.
+            load (Callable): Coroutine function performing the load.
+
+        Returns:
+            Any: The result of the shared load (its exception is raised to every caller).
+        """
+        task = self._calls.get(key)
+        if task is None:
+            SINGLEFLIGHT_LOADS.inc(kind=key[0])
+            task = asyncio.ensure_future(load())
+            self._calls[key] = task
+
+            def forget(done):
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+
+            task.add_done_callback(forget)
+        else:
+            SINGLEFLIGHT_COALESCED.inc(kind=key[0])
+        # Shielded, so one caller going away does not cancel the load for the others
+        return await asyncio.shield(task)
+
+
+single_flight = SingleFlight()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cached tree loaders shared by the read endpoints. Loads may be shared by
+# concurrent requests (single-flight), so they open their own read session
+# instead of borrowing one request's session, which could be closed (or the
+# request cancelled) while the others still wait on the load.
+# ─────────────────────────────────────────────────────────────────────────────
+async def load_compact_tree(prefer_primary: bool = False) -> CompactTree:
+    """
+    Return the full tree as a CompactTree, served from the in-process cache when possible.
+
+    Concurrent misses share a single query and build. With TREE_SNAPSHOT_DIR
+    set, the tree is mapped from the shared snapshot when it is current, and
+    a tree built from the database is published there for the other workers.
+
+    Parameters:
+        prefer_primary (bool): Read from the primary instead of a replica.
+
+    Returns:
+        CompactTree: Every node reachable from a root, in pre-order.
+    """
+    tree = tree_cache.get("compact")
+    if tree is not None:
+        return tree
+
+    version = tree_cache.version
+
+    async def build():
+        generation = snapshot_store.generation() if snapshot_store is not None else None
+        known_version = tree_version_listener.version or 0
+        compact = snapshot_store.load(generation, known_version) if snapshot_store is not None else None
+        if compact is None:
+            with stage("query"):
+                async with read_session(prefer_primary) as db:
+                    rows = await crud.get_all_nodes(db)
+            with stage("build"):
+                compact = CompactTree.from_rows(rows)
+            if snapshot_store is not None and snapshot_store.generation() == generation:
+                compact = await publish_snapshot(compact, generation, known_version)
+        record_tree_size(len(compact))
+        tree_cache.set("compact", compact, version=version, size=len(compact))
+        return compact
+
+    return await single_flight.do(("compact", version), build)
+
+
+async def publish_snapshot(compact: CompactTree, generation: int, tree_version: int) -> CompactTree:
+    """
+    Publish a freshly built tree as the shared snapshot and return its mapped copy.
+
+    Serving the mapped copy lets the private arrays be freed, so the workers
+    share the page cache. On failure the built tree is returned as is.
+
+    Parameters:
+        compact (CompactTree): Tree built from the database.
+        generation (int): Snapshot generation read before the tree was loaded.
+        tree_version (int): Shared tree version known before the tree was loaded.
+
+    Returns:
+        CompactTree: The mapped snapshot, or compact if it could not be published.
+    """
+    try:
+        with stage("snapshot"):
+            await asyncio.to_thread(snapshot_store.publish, compact, generation, tree_version)
+            return snapshot_store.load(generation, tree_version) or compact
+    except OSError as e:
+        logger.warning(f"Could not publish tree snapshot: {e}")
+        return compact
+
+
+async def load_tree(depth: int | None = None, prefer_primary: bool = False):
+    """
+    Return the nested tree, served from the in-process cache when possible.
+
+    Parameters:
+        depth (int | None): Number of levels below the roots to include; None for all.
+        prefer_primary (bool): Read from the primary instead of a replica.
+
+    Returns:
+        tuple[list[dict], int]: Root-level nodes with nested children, and the node count.
+    """
+    if depth is None:
+        tree = await load_compact_tree(prefer_primary)
+        with stage("build"):
+            return tree.to_nested(), len(tree)
+
+    key = ("tree", depth)
+    entry = tree_cache.get(key)
+    if entry is None:
+        version = tree_cache.version
+        with stage("query"):
+            async with read_session(prefer_primary) as db:
+                nodes, child_counts = await crud.get_tree_levels(db, depth)
+        with stage("build"):
+            roots, _ = build_tree(nodes, child_counts=child_counts)
+        record_tree_size(len(nodes))
+        entry = (roots, len(nodes))
+        tree_cache.set(key, entry, version=version, size=entry[1])
+    return entry
+
+
+async def load_subtree(node_id: int, depth: int | None = None, prefer_primary: bool = False):
+    """
+    Return the nested subtree rooted at node_id, served from the cache when possible.
+
+    A full subtree is sliced out of the cached CompactTree when one is
+    available, without touching the database.
+
+    Parameters:
+        node_id (int): ID of the subtree root.
+        depth (int | None): Number of levels below node_id to include; None for all.
+        prefer_primary (bool): Read from the primary instead of a replica.
+
+    Returns:
+        tuple[dict | None, int]: The subtree (None if the node does not exist), and its node count.
+    """
+    if depth is None:
+        tree = tree_cache.get("compact")
+        if tree is not None:
+            with stage("build"):
+                return tree.to_nested(node_id), len(tree.subtree(node_id))
+
+    key = ("subtree", node_id, depth)
+    entry = tree_cache.get(key)
+    if entry is None:
+        version = tree_cache.version
+        with stage("query"):
+            async with read_session(prefer_primary) as db:
+                if depth is None:
+                    nodes, child_counts = await crud.get_subtree_nodes(db, node_id), None
+                else:
+                    nodes, child_counts = await crud.get_tree_levels(db, depth, node_id)
+        with stage("build"):
+            _, index = build_tree(nodes, child_counts=child_counts)
+        record_tree_size(len(nodes))
+        entry = (index.get(node_id), len(nodes))
+        if entry[0] is not None:
+            tree_cache.set(key, entry, version=version, size=entry[1])
+    return entry
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Pre-serialized JSON responses with ETag revalidation
+# ─────────────────────────────────────────────────────────────────────────────
+def encode_response(payload: dict) -> bytes:
+    """
+    Encode a tree response payload (data from build_tree) in the ResponseWrapper format.
+
+    The tree is trusted build_tree output, so it is encoded directly instead
+    of being validated through the recursive TreeNodeResponse model. With
+    TREE_JSON_ENCODER=orjson the whole payload is dumped by orjson; trees
+    deeper than orjson's nesting limit fall back to the iterative encoder.
+    Both produce the same JSON as ResponseWrapper.
+
+    Parameters:
+        payload (dict): Response content with code, message and data.
+
+    Returns:
+        bytes: The JSON-encoded response body.
+    """
+    if USE_ORJSON:
+        try:
+            return orjson.dumps(payload)
+        except orjson.JSONEncodeError:
+            pass
+
+    envelope = json.dumps(
+        {"code": payload["code"], "message": payload["message"]}, ensure_ascii=False, separators=(",", ":")
+    )
+    return b"".join([envelope[:-1].encode(), b',"data":', encode_tree_json(payload["data"]), b"}"])
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag (weak comparison, per RFC 9110).
+
+    Parameters:
+        if_none_match (str | None): Raw If-None-Match header value.
+        etag (str): Quoted strong ETag of the current representation.
+
+    Returns:
+        bool: True if the client already holds the current representation.
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+async def cached_body(key, load_payload) -> tuple[bytes, str]:
+    """
+    Return the encoded JSON body and ETag for key, cached per tree version.
+
+    The body is encoded once per version and stored with a strong ETag
+    derived from its content. Concurrent misses for the same key share one
+    load and encode. With shared snapshots enabled, writes made by other
+    workers are picked up first (see TreeSnapshotStore.sync).
+
+    Parameters:
+        key (Hashable): Cache key for the encoded body.
+        load_payload (Callable): Coroutine function returning (payload, node_count).
+
+    Returns:
+        tuple[bytes, str]: The JSON body and its quoted ETag.
+    """
+    if snapshot_store is not None:
+        snapshot_store.sync()
+    entry = tree_cache.get(("json", key))
+    if entry is None:
+        version = tree_cache.version
+
+        async def load_and_encode():
+            payload, size = await load_payload()
+            with stage("encode"):
+                body = encode_response(payload)
+            encoded = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+            tree_cache.set(("json", key), encoded, version=version, size=size)
+            return encoded
+
+        entry = await single_flight.do(("json", key, version), load_and_encode)
+    return entry
+
+
+async def cached_json_response(request: Request, key, load_payload):
+    """
+    Serve a JSON response from encoded bytes cached per tree version (see cached_body).
+
+    Requests whose If-None-Match matches the ETag get an empty 304 instead
+    of the body.
+
+    Parameters:
+        request (Request): Incoming request, checked for If-None-Match.
+        key (Hashable): Cache key for the encoded body.
+        load_payload (Callable): Coroutine function returning (payload, node_count).
+
+    Returns:
+        Response: 200 with the JSON body, or 304 Not Modified.
+    """
+    entry = await cached_body(key, load_payload)
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Create a new tree node
@@ -47,38 +360,129 @@ async def create_node(node: schemas.TreeNodeCreate, db: AsyncSession = Depends(g
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Create many nodes in one transaction
+# ─────────────────────────────────────────────────────────────────────────────
+@router.post("/tree/bulk", response_model=schemas.ResponseWrapper, status_code=status.HTTP_201_CREATED)
+async def bulk_create_nodes(payload: schemas.TreeNodeBulkCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Create many nodes in one transaction, from a flat list and/or nested trees.
+
+    Items refer to each other with client-side tempIds (parentTempId or
+    nesting) and to existing nodes with parentId. Either every node is
+    created or none is.
+
+    Parameters:
+        payload (TreeNodeBulkCreate): Items to create.
+        db (AsyncSession): Async SQLAlchemy session dependency.
+
+    Returns:
+        ResponseWrapper: Number of nodes created and the tempId -> ID mapping.
+
+    Raises:
+        InvalidParentIDException: If a parent reference is invalid.
+        HTTPException: For internal server errors.
+    """
+    try:
+        result = await crud.bulk_create_nodes(db, payload)
+        return {
+            "code": 201,
+            "message": f"{result.created} nodes created successfully",
+            "data": result
+        }
+    except (InvalidParentIDException, NodeNotFoundException):
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error while bulk creating nodes: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Stream the entire tree as NDJSON or nested JSON
+# (declared before /tree/{node_id} so "export" is not parsed as an ID)
+# ─────────────────────────────────────────────────────────────────────────────
+@router.get("/tree/export")
+async def export_tree(
+    request: Request,
+    format: Literal["ndjson", "json"] = "ndjson",
+    batch_size: int = Query(5000, ge=1, le=100000),
+):
+    """
+    Stream the entire tree without materializing it in memory.
+
+    Rows are read from the database in server-side batches and encoded as
+    they arrive, so the first byte is sent immediately and memory stays
+    bounded regardless of tree size. Nodes are emitted in depth-first order.
+    Siblings come in materialized-path order, i.e. by the string form of
+    their IDs (10 before 9), while GET /tree lists them by numeric ID; the
+    nodes and their nesting are the same.
+
+    Parameters:
+        request (Request): Incoming request, checked for read-your-writes stickiness.
+        format (str): "ndjson" for one {"id", "label", "parentId"} object per line,
+            or "json" for the nested ResponseWrapper format of GET /tree.
+        batch_size (int): Number of rows fetched from the database per round trip.
+
+    Returns:
+        StreamingResponse: The encoded tree.
+    """
+    prefer_primary = prefers_primary(request)
+
+    async def batches():
+        # The stream outlives this handler, so it owns its (read replica) session
+        async with read_session(prefer_primary) as db:
+            async for batch in crud.stream_node_batches(db, batch_size):
+                yield batch
+
+    if format == "ndjson":
+        return StreamingResponse(encode_ndjson(batches()), media_type="application/x-ndjson")
+
+    return StreamingResponse(
+        encode_nested_json(batches(), prefix='{"code":200,"message":"Tree exported successfully","data":', suffix="}"),
+        media_type="application/json",
+    )
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Retrieve a node by its ID, including any children in a nested structure
 # ─────────────────────────────────────────────────────────────────────────────
 @router.get("/tree/{node_id}", response_model=schemas.ResponseWrapper)
-async def get_node_by_id(node_id: int, db: AsyncSession = Depends(get_db)):
+async def get_node_by_id(
+    node_id: int,
+    request: Request,
+    depth: Optional[int] = Query(None, ge=0),
+):
     """
     Retrieve a node by its ID, including any children in a nested structure.
 
     Parameters:
         node_id (int): ID of the node to retrieve.
-        db (AsyncSession): Async SQLAlchemy session dependency.
+        request (Request): Incoming request, checked for If-None-Match.
+        depth (Optional[int]): Levels of descendants to include; nodes on the last
+            level carry hasChildren/childCount markers. Omit for the whole subtree.
 
     Returns:
-        ResponseWrapper: Nested node structure starting from node_id, or error.
+        ResponseWrapper: Nested node structure starting from node_id (or 304 if
+        unchanged since the ETag sent by the client).
 
     Raises:
         NodeNotFoundException: If no node with the given ID exists.
         HTTPException: For unexpected server errors.
     """
-    try:
-        all_nodes = await crud.get_all_nodes(db)
-        full_tree = build_tree(all_nodes)
-        node_subtree = find_subtree_by_id(full_tree, node_id)
+    prefer_primary = prefers_primary(request)
 
+    async def load_payload():
+        node_subtree, size = await load_subtree(node_id, depth, prefer_primary)
         if not node_subtree:
             raise NodeNotFoundException(node_id)
-
         return {
             "code": 200,
             "message": f"Node {node_id} retrieved successfully",
             "data": node_subtree
-        }
+        }, size
+
+    try:
+        return await cached_json_response(request, ("subtree", node_id, depth), load_payload)
 
     except (InvalidParentIDException, NodeNotFoundException):
         raise
@@ -87,33 +491,147 @@ async def get_node_by_id(node_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Retrieve one page of a node's direct children
+# ─────────────────────────────────────────────────────────────────────────────
+@router.get("/tree/{node_id}/children", response_model=schemas.ResponseWrapper)
+async def get_children(
+    node_id: int,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Retrieve one page of a node's direct children, ordered by ID.
+
+    Parameters:
+        node_id (int): ID of the parent node.
+        limit (int): Maximum number of children per page.
+        cursor (Optional[int]): nextCursor from the previous page; omit for the first page.
+        db (AsyncSession): Async SQLAlchemy session dependency.
+
+    Returns:
+        ResponseWrapper: The page of children (each with hasChildren/childCount) and nextCursor.
+
+    Raises:
+        NodeNotFoundException: If no node with the given ID exists.
+        HTTPException: For unexpected server errors.
+    """
+    try:
+        page = await crud.get_children_page(db, node_id, limit, cursor)
+        return {
+            "code": 200,
+            "message": f"Children of node {node_id} retrieved successfully",
+            "data": page
+        }
+    except NodeNotFoundException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching children of node {node_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Get the entire tree structure starting from root nodes
 # ─────────────────────────────────────────────────────────────────────────────
+async def tree_payload(depth: int | None = None, prefer_primary: bool = False):
+    """
+    Build the GET /tree response payload.
+
+    Parameters:
+        depth (int | None): Levels below the roots to include; None for all.
+        prefer_primary (bool): Read from the primary instead of a replica.
+
+    Returns:
+        tuple[dict, int]: The response payload and its node count.
+    """
+    tree, size = await load_tree(depth, prefer_primary)
+    return {
+        "code": 200,
+        "message": "Tree retrieved successfully" if tree else "No nodes found",
+        "data": tree
+    }, size
+
+
+async def prewarm_tree_cache():
+    """
+    Load and encode the full tree into the cache ahead of the first GET /tree.
+
+    Meant to run as a background task after startup. Failures are logged
+    and otherwise ignored; the first request then loads the tree itself.
+    """
+    try:
+        body, _ = await cached_body(("tree", None), tree_payload)
+        logger.info(f"Pre-warmed tree cache ({len(body)} bytes)")
+    except Exception as e:
+        logger.warning(f"Tree cache pre-warm failed: {e}", exc_info=True)
+
+
 @router.get("/tree", response_model=schemas.ResponseWrapper)
-async def get_tree(db: AsyncSession = Depends(get_db)):
+async def get_tree(
+    request: Request,
+    depth: Optional[int] = Query(None, ge=0),
+):
     """
     Get the entire tree structure starting from root nodes.
 
     Parameters:
-        db (AsyncSession): Async SQLAlchemy session dependency.
+        request (Request): Incoming request, checked for If-None-Match.
+        depth (Optional[int]): Levels below the roots to include; nodes on the last
+            level carry hasChildren/childCount markers. Omit for the whole tree.
 
     Returns:
-        ResponseWrapper: A list of root-level nodes with nested children.
+        ResponseWrapper: A list of root-level nodes with nested children (or 304
+        if unchanged since the ETag sent by the client).
 
     Raises:
         HTTPException: If the operation fails.
     """
+    prefer_primary = prefers_primary(request)
     try:
-        nodes = await crud.get_all_nodes(db)
-        tree = build_tree(nodes)
+        return await cached_json_response(
+            request, ("tree", depth), lambda: tree_payload(depth, prefer_primary)
+        )
+    except Exception as e:
+        logger.error(f"Error retrieving tree: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Apply many label changes and moves atomically
+# (declared before /tree/{node_id} so "batch" is not parsed as an ID)
+# ─────────────────────────────────────────────────────────────────────────────
+@router.put("/tree/batch", response_model=schemas.ResponseWrapper)
+async def batch_update_nodes(payload: schemas.TreeNodeBatchUpdate, db: AsyncSession = Depends(get_db)):
+    """
+    Apply many label changes and reparent moves in one transaction.
+
+    All moves are validated together against the final parent graph, so a
+    batch may, for example, move B out from under A and then A under B.
+
+    Parameters:
+        payload (TreeNodeBatchUpdate): Changes to apply, at most one per node.
+        db (AsyncSession): Async SQLAlchemy session dependency.
+
+    Returns:
+        ResponseWrapper: Number of relabeled and moved nodes.
+
+    Raises:
+        InvalidParentIDException: If a parentId is invalid or the moves cause a cycle.
+        NodeNotFoundException: If a node doesn't exist.
+        HTTPException: For internal server errors.
+    """
+    try:
+        result = await crud.batch_update_nodes(db, payload)
         return {
             "code": 200,
-            "message": "Tree retrieved successfully" if tree else "No nodes found",
-            "data": tree
+            "message": "Batch update applied successfully",
+            "data": result
         }
+    except (InvalidParentIDException, NodeNotFoundException):
+        raise
     except Exception as e:
-        logger.error(f"Error retrieving tree: {e}", exc_info=True)
+        logger.error(f"Error applying batch update: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
@@ -156,22 +674,35 @@ async def update_node(node_id: int, update_data: schemas.TreeNodeCreate, db: Asy
 # Delete a node by its ID
 # ─────────────────────────────────────────────────────────────────────────────
 @router.delete("/tree/{node_id}", response_model=schemas.ResponseWrapper)
-async def delete_node(node_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_node(node_id: int, cascade: bool = False, db: AsyncSession = Depends(get_db)):
     """
     Delete a node by its ID.
 
+    By default only the node is removed and its children become root nodes.
+    With cascade=true the node and its entire subtree are removed with one
+    set-based statement, and the number of deleted nodes is returned.
+
     Parameters:
         node_id (int): ID of the node to delete.
+        cascade (bool): Delete the whole subtree rooted at the node.
         db (AsyncSession): Async SQLAlchemy session dependency.
 
     Returns:
-        ResponseWrapper: Status of deletion.
+        ResponseWrapper: Status of deletion (with deletedCount when cascading).
 
     Raises:
         NodeNotFoundException: If node does not exist.
         HTTPException: For internal server errors.
     """
     try:
+        if cascade:
+            deleted_count = await crud.delete_subtree(db, node_id)
+            return {
+                "code": 200,
+                "message": f"Node {node_id} and its subtree deleted successfully",
+                "data": {"deletedCount": deleted_count}
+            }
+
         await crud.delete_node_by_id(db, node_id)
         return {
             "code": 200,
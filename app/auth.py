@@ -1,19 +1,24 @@
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+# app/auth.py
+
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from threading import Lock
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Maximum number of validated tokens whose claims are kept in memory
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
 # Dummy user
@@ -22,18 +27,26 @@ fake_user = {
     "hashed_password": "$2b$12$gszXg256rSA76CN6VCtYr.EztIRnMrIF5iSg.wyz6WNf2MHtmUdPi"
 }
 
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-print(pwd_context.hash("password"))
-
 class TokenData(BaseModel):
     username: str | None = None
 
+class Token(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    """Builds the bcrypt CryptContext on first use, keeping passlib out of startup."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    """Checks a password against a bcrypt hash. CPU-bound (~250 ms); call it from a thread pool."""
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def authenticate_user(username: str, password: str):
+    """Returns True if the credentials are valid. Blocking (bcrypt); call it from a thread pool."""
     if username != fake_user["username"]:
         return False
     if not verify_password(password, fake_user["hashed_password"]):
@@ -41,12 +54,64 @@ def authenticate_user(username: str, password: str):
     return True
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
+    from jose import jwt  # imported on first use to keep it out of startup
+
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Bounded cache of validated token claims, so repeat requests skip decoding
+# ─────────────────────────────────────────────────────────────────────────────
+class TokenClaimsCache:
+    """
+    LRU map of token -> (username, expiry) for tokens that passed validation.
+
+    Entries are dropped once the token expires, so a cached token is never
+    accepted past its "exp" claim.
+
+    Attributes:
+        max_entries (int): Maximum number of tokens kept.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, token: str) -> str | None:
+        """Returns the username for a cached, unexpired token, or None."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            username, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return username
+
+    def set(self, token: str, username: str, expires_at: float):
+        """Caches the claims of a validated token until expires_at (epoch seconds)."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (username, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+token_cache = TokenClaimsCache(max_entries=TOKEN_CACHE_SIZE)
+
 def get_current_user(token: str = Depends(oauth2_scheme)):
+    cached_username = token_cache.get(token)
+    if cached_username is not None:
+        return cached_username
+
+    from jose import JWTError, jwt  # imported on first use to keep it out of startup
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid credentials",
@@ -57,6 +122,7 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         username = payload.get("sub")
         if username is None:
             raise credentials_exception
+        token_cache.set(token, username, float(payload["exp"]))
         return username
-    except JWTError:
+    except (JWTError, KeyError, TypeError, ValueError):
         raise credentials_exception
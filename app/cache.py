@@ -0,0 +1,115 @@
+# app/cache.py
+
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# In-process LRU cache for built trees, invalidated on every write
+# ─────────────────────────────────────────────────────────────────────────────
+class TreeCache:
+    """
+    In-process LRU cache for tree structures produced by build_tree().
+
+    Every entry belongs to a tree version. Write paths call invalidate(),
+    which bumps the version and drops all entries, so readers never see a
+    tree older than the last committed write made by this process.
+
+    Attributes:
+        version (int): Current tree version, incremented on each invalidation.
+        invalidated_at (float): time.monotonic() of the last invalidation (last write).
+        max_entries (int): Maximum number of cached trees/subtrees.
+        max_nodes (int): Maximum total number of nodes held across all entries.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that had to be rebuilt.
+        listeners (list[Callable]): Called after each local invalidation (a write by this process).
+    """
+
+    def __init__(self, max_entries: int = 128, max_nodes: int = 1_000_000):
+        self.version = 0
+        self.invalidated_at = float("-inf")
+        self.max_entries = max_entries
+        self.max_nodes = max_nodes
+        self.hits = 0
+        self.misses = 0
+        self.listeners = []
+        self._entries = OrderedDict()
+        self._total_nodes = 0
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value for key at the current version, or None.
+
+        Parameters:
+            key (Hashable): Cache key, e.g. "tree" or ("subtree", node_id).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, version: int, size: int = 1):
+        """
+        Stores value under key if it was built at the current version.
+
+        A value loaded before a concurrent write (an older version) is
+        discarded instead of being cached as if it were current.
+
+        Parameters:
+            key (Hashable): Cache key.
+            value (Any): Value to cache.
+            version (int): The cache version read before the value was loaded.
+            size (int): Number of nodes in the value, counted against max_nodes.
+        """
+        with self._lock:
+            if version != self.version or size > self.max_nodes or self.max_entries <= 0:
+                return
+            if key in self._entries:
+                self._total_nodes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._total_nodes += size
+
+            while len(self._entries) > self.max_entries or self._total_nodes > self.max_nodes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_nodes -= evicted_size
+
+    def invalidate(self, notify: bool = True):
+        """
+        Drops every entry and moves the cache to a new version.
+
+        Parameters:
+            notify (bool): Whether to call the listeners. False when reacting
+                to a write made elsewhere, so it is not propagated back.
+        """
+        with self._lock:
+            self.version += 1
+            self.invalidated_at = time.monotonic()
+            self._entries.clear()
+            self._total_nodes = 0
+        if notify:
+            for listener in self.listeners:
+                listener()
+
+    def stats(self) -> dict:
+        """Returns counters describing cache usage."""
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "nodes": self._total_nodes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+tree_cache = TreeCache(
+    max_entries=int(os.getenv("TREE_CACHE_MAX_ENTRIES", "128")),
+    max_nodes=int(os.getenv("TREE_CACHE_MAX_NODES", "1000000")),
+)
@@ -1,11 +1,76 @@
 # app/crud.py
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, insert, delete, update, and_, or_, func, literal, case, bindparam
 from app import models, schemas
+from app.cache import tree_cache
+from app.invalidation import bump_tree_version, tree_version_listener
 from app.exceptions import InvalidParentIDException, NodeNotFoundException
-from app.utils import build_tree, is_descendant
-from sqlalchemy.orm import selectinload
+from app.utils import (
+    build_tree, is_descendant, node_path, path_upper_bound, plan_bulk_levels, resolve_moved_paths
+)
+from sqlalchemy.orm import aliased
+
+
+def _subtree_filter(path: str):
+    """Range condition selecting every node whose path starts with `path`."""
+    return and_(models.TreeNode.path >= path, models.TreeNode.path < path_upper_bound(path))
+
+
+def _child_count(parent_id_column):
+    """Correlated scalar subquery counting the direct children of parent_id_column."""
+    child = aliased(models.TreeNode)
+    return select(func.count()).where(child.parent_id == parent_id_column).scalar_subquery()
+
+
+async def _rewrite_subtree_paths(db: AsyncSession, old_path: str, new_prefix: str):
+    """Replaces the `old_path` prefix of every path in that subtree with `new_prefix`."""
+    await db.execute(
+        update(models.TreeNode)
+        .where(_subtree_filter(old_path))
+        .values(path=literal(new_prefix) + func.substr(models.TreeNode.path, len(old_path) + 1))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _lock_tree_for_write(db: AsyncSession):
+    """
+    Serializes tree writes by locking the tree_version row before any path is read.
+
+    Must be the first statement of a write that reads materialized paths:
+    under READ COMMITTED, a path read before the lock could be rewritten
+    by a concurrent move, leaving the new rows with a stale prefix. Later
+    statements see every write committed before the lock was granted.
+    SQLite already serializes writers, and FOR UPDATE is omitted there.
+    """
+    await db.execute(select(models.tree_version.c.version).with_for_update())
+
+
+async def _commit_tree_write(db: AsyncSession):
+    """
+    Commits a tree write and invalidates cached trees in every process.
+
+    The shared tree version is bumped in the same transaction; this process
+    drops its own cache right away, the others follow the version.
+    """
+    version = await bump_tree_version(db)
+    await db.commit()
+    tree_cache.invalidate()
+    tree_version_listener.observe_local(version)
+
+
+async def _node_response(db: AsyncSession, node_id: int) -> schemas.TreeNodeResponse | None:
+    """
+    Builds the response for one node and its direct children, without walking deeper.
+
+    Children carry hasChildren/childCount markers instead of their own
+    subtrees, so the response stays small and is never validated recursively.
+    Returns None if the node does not exist.
+    """
+    nodes, child_counts = await get_tree_levels(db, 1, node_id)
+    _, index = build_tree(nodes, child_counts=child_counts)
+    node = index.get(node_id)
+    return schemas.TreeNodeResponse.model_validate(node) if node else None
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -26,7 +91,10 @@ async def create_node(db: AsyncSession, node: schemas.TreeNodeCreate) -> schemas
         InvalidParentIDException: If the specified parentId does not exist.
     """
 
+    await _lock_tree_for_write(db)
+
     # Validate parentId if provided
+    parent = None
     if node.parentId is not None:
         result = await db.execute(
             select(models.TreeNode).filter(models.TreeNode.id == node.parentId)
@@ -35,37 +103,278 @@ async def create_node(db: AsyncSession, node: schemas.TreeNodeCreate) -> schemas
         if not parent:
             raise InvalidParentIDException(node.parentId)
         
-    # Create and commit the new TreeNode
+    # Create the new TreeNode, then derive its path once the ID is assigned
     db_node = models.TreeNode(label=node.label, parent_id=node.parentId)
     db.add(db_node)
-    await db.commit()
-    await db.refresh(db_node)
+    await db.flush()
+    db_node.path = node_path(parent.path if parent else None, db_node.id)
+    await _commit_tree_write(db)
+
+    return await _node_response(db, db_node.id)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Creates many nodes in a single transaction
+# ─────────────────────────────────────────────────────────────────────────────
+async def bulk_create_nodes(db: AsyncSession, payload: schemas.TreeNodeBulkCreate) -> schemas.TreeNodeBulkResult:
+    """
+    Creates many nodes (flat list and/or nested trees) in a single transaction.
+
+    Parent references are validated in memory, existing parents are checked
+    with one query, and all rows are inserted with one multi-row INSERT ...
+    RETURNING, regardless of nesting depth. Rows whose parent is part of the
+    batch are inserted without parent_id, which is then written with the
+    materialized paths in a single executemany UPDATE, followed by one commit.
+
+    Parameters:
+        db (AsyncSession): The database session.
+        payload (TreeNodeBulkCreate): Items to create, referencing each other by tempId.
+
+    Returns:
+        TreeNodeBulkResult: Number of nodes created and the tempId -> ID mapping.
+
+    Raises:
+        InvalidParentIDException: If a parentId does not exist, or tempIds are duplicated,
+            unknown or cyclic. Nothing is written in that case.
+    """
+    levels = plan_bulk_levels(payload.nodes)
+    await _lock_tree_for_write(db)
 
-    # Re-fetch the node with eager-loaded children before returning
-    # Required for Pydantic to access children in async environment
-    stmt = select(models.TreeNode).options(selectinload(models.TreeNode.children)).where(models.TreeNode.id == db_node.id)
-    result = await db.execute(stmt)
-    node_with_children = result.scalar_one()
+    # Validate all existing parents with one query
+    parent_ids = {item.parentId for _, item, _ in levels[0] if item.parentId is not None} if levels else set()
+    parent_paths = {}
+    if parent_ids:
+        result = await db.execute(
+            select(models.TreeNode.id, models.TreeNode.path).where(models.TreeNode.id.in_(parent_ids))
+        )
+        parent_paths = dict(result.all())
+        missing = parent_ids - parent_paths.keys()
+        if missing:
+            raise InvalidParentIDException(min(missing))
+
+    # Each row is inserted with a placeholder path ("~<key>", outside every
+    # "/..." subtree range) so generated IDs can be matched back to items
+    # without relying on RETURNING row order, which SQLite does not guarantee
+    table = models.TreeNode.__table__
+    items = [entry for level in levels for entry in level]
+    ids = {}
+    paths = {}
+    if items:
+        rows = [
+            {"label": item.label, "parent_id": item.parentId if parent_key is None else None, "path": f"~{key}"}
+            for key, item, parent_key in items
+        ]
+        result = await db.execute(insert(table).returning(table.c.id, table.c.path), rows)
+        for node_id, placeholder in result.all():
+            ids[int(placeholder[1:])] = node_id
+
+        # Levels are ordered parents first, so every parent's path is known before its children
+        for key, item, parent_key in items:
+            parent_path = paths[parent_key] if parent_key is not None else parent_paths.get(item.parentId)
+            paths[key] = node_path(parent_path, ids[key])
+
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("node_id"))
+            .values(parent_id=bindparam("new_parent_id"), path=bindparam("node_path")),
+            [
+                {
+                    "node_id": ids[key],
+                    "new_parent_id": ids[parent_key] if parent_key is not None else item.parentId,
+                    "node_path": paths[key],
+                }
+                for key, item, parent_key in items
+            ],
+        )
+    await _commit_tree_write(db)
+
+    id_map = {
+        item.tempId: ids[key]
+        for level in levels
+        for key, item, _ in level
+        if item.tempId is not None
+    }
+    return schemas.TreeNodeBulkResult(created=len(ids), idMap=id_map)
 
-    return schemas.TreeNodeResponse.model_validate(node_with_children)
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Retrieves all nodes from the database
 # ─────────────────────────────────────────────────────────────────────────────
 async def get_all_nodes(db: AsyncSession):
     """
-    Retrieves all nodes from the database, including their children.
+    Retrieves all nodes from the database as flat (id, label, parent_id) rows.
+
+    Only the three columns build_tree needs are selected, through a Core
+    statement on the session's connection: no ORM entities, identity map
+    or relationship loading. Rows are ordered by ID, so siblings in the
+    built tree are too.
+
+    Parameters:
+        db (AsyncSession): The database session.
+
+    Returns:
+        List[Row]: One (id, label, parent_id) row per node, ordered by ID.
+    """
+    table = models.TreeNode.__table__
+    conn = await db.connection()
+    result = await conn.execute(select(table.c.id, table.c.label, table.c.parent_id).order_by(table.c.id))
+    return result.all()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Streams all tree nodes in depth-first order, batch by batch
+# ─────────────────────────────────────────────────────────────────────────────
+async def stream_node_batches(db: AsyncSession, batch_size: int = 5000):
+    """
+    Streams every node reachable from a root as flat rows, in batches.
+
+    Rows are ordered by materialized path, which is a depth-first pre-order:
+    each node comes after its parent and before any node outside its subtree.
+    Siblings follow the string order of their IDs ("/1/10/" before "/1/9/"),
+    unlike the ID order of the other reads; ordering by path keeps the
+    stream on the path index instead of sorting the whole table first.
+    A server-side cursor is used where the driver supports one, so memory
+    stays bounded by batch_size regardless of tree size.
+
+    Parameters:
+        db (AsyncSession): The database session.
+        batch_size (int): Number of rows fetched per round trip.
+
+    Yields:
+        List[Row]: Batches of (id, label, parent_id) rows.
+    """
+    result = await db.stream(
+        select(models.TreeNode.id, models.TreeNode.label, models.TreeNode.parent_id)
+        .where(models.TreeNode.path.is_not(None))
+        .order_by(models.TreeNode.path)
+        .execution_options(yield_per=batch_size)
+    )
+    async for batch in result.partitions(batch_size):
+        yield batch
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Retrieves a node and all of its descendants from the database
+# ─────────────────────────────────────────────────────────────────────────────
+async def get_subtree_nodes(db: AsyncSession, node_id: int):
+    """
+    Retrieves the node with the given ID and all of its descendants.
+
+    The subtree is read with a single indexed range scan over the materialized
+    `path` column, so only the requested rows are touched.
+
+    Parameters:
+        db (AsyncSession): The database session.
+        node_id (int): ID of the subtree root.
+
+    Returns:
+        List[Row]: Flat (id, label, parent_id) rows of the subtree ordered by ID, empty if the node does not exist.
+    """
+    result = await db.execute(select(models.TreeNode.path).where(models.TreeNode.id == node_id))
+    root_path = result.scalar_one_or_none()
+    if root_path is None:
+        return []
+
+    result = await db.execute(
+        select(models.TreeNode.id, models.TreeNode.label, models.TreeNode.parent_id)
+        .where(_subtree_filter(root_path))
+        .order_by(models.TreeNode.id)
+    )
+    return result.all()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Retrieves the top levels of the tree or of a subtree
+# ─────────────────────────────────────────────────────────────────────────────
+async def get_tree_levels(db: AsyncSession, depth: int, node_id: int | None = None):
+    """
+    Retrieves the nodes within `depth` levels of the roots (or of node_id).
+
+    A depth-bounded recursive CTE walks down through the (parent_id, id)
+    index, so only the returned levels are read. Nodes on the last level
+    also get their direct child count, for hasChildren/childCount markers.
 
     Parameters:
         db (AsyncSession): The database session.
+        depth (int): Number of levels below the starting level to include (0 = starting level only).
+        node_id (Optional[int]): Subtree root; None starts from all root nodes.
 
     Returns:
-        List[TreeNode]: List of all TreeNode objects with eager-loaded children.
+        Tuple[List[Row], Dict[int, int]]: (id, label, parent_id) rows ordered by id,
+        and {id: child_count} for the nodes on the last level.
     """
+    anchor = select(models.TreeNode.id, literal(0).label("level"))
+    if node_id is None:
+        anchor = anchor.where(models.TreeNode.parent_id.is_(None))
+    else:
+        anchor = anchor.where(models.TreeNode.id == node_id)
+
+    levels = anchor.cte(name="levels", recursive=True)
+    levels = levels.union_all(
+        select(models.TreeNode.id, levels.c.level + 1)
+        .where(models.TreeNode.parent_id == levels.c.id)
+        .where(levels.c.level < depth)
+    )
+
     result = await db.execute(
-        select(models.TreeNode).options(selectinload(models.TreeNode.children))
+        select(
+            models.TreeNode.id,
+            models.TreeNode.label,
+            models.TreeNode.parent_id,
+            case((levels.c.level == depth, _child_count(levels.c.id)), else_=None).label("child_count"),
+        )
+        .join(levels, models.TreeNode.id == levels.c.id)
+        .order_by(models.TreeNode.id)
     )
-    return result.scalars().all()
+    rows = result.all()
+    child_counts = {row.id: row.child_count for row in rows if row.child_count is not None}
+    return rows, child_counts
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Retrieves one page of a node's direct children
+# ─────────────────────────────────────────────────────────────────────────────
+async def get_children_page(
+    db: AsyncSession, node_id: int, limit: int, cursor: int | None = None
+) -> schemas.TreeNodeChildrenPage:
+    """
+    Retrieves one page of a node's direct children using keyset pagination.
+
+    Children are ordered by ID and read from the (parent_id, id) index, so
+    every page costs the same regardless of how far into the list it is.
+
+    Parameters:
+        db (AsyncSession): The database session.
+        node_id (int): ID of the parent node.
+        limit (int): Maximum number of children to return.
+        cursor (Optional[int]): nextCursor from the previous page, or None for the first page.
+
+    Returns:
+        TreeNodeChildrenPage: The children with child counts, and the cursor of the next page.
+
+    Raises:
+        NodeNotFoundException: If the parent node does not exist.
+    """
+    stmt = (
+        select(models.TreeNode.id, models.TreeNode.label, _child_count(models.TreeNode.id).label("child_count"))
+        .where(models.TreeNode.parent_id == node_id)
+        .order_by(models.TreeNode.id)
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        stmt = stmt.where(models.TreeNode.id > cursor)
+    rows = (await db.execute(stmt)).all()
+
+    if not rows:
+        result = await db.execute(select(models.TreeNode.id).where(models.TreeNode.id == node_id))
+        if result.scalar_one_or_none() is None:
+            raise NodeNotFoundException(node_id)
+
+    items = [
+        schemas.TreeNodeResponse(id=row.id, label=row.label, hasChildren=row.child_count > 0, childCount=row.child_count)
+        for row in rows[:limit]
+    ]
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return schemas.TreeNodeChildrenPage(items=items, nextCursor=next_cursor)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -85,16 +394,11 @@ async def get_node_by_id(db: AsyncSession, node_id: int) -> schemas.TreeNodeResp
     Raises:
         NodeNotFoundException: If the node with given ID does not exist.
     """
-    result = await db.execute(
-        select(models.TreeNode)
-        .options(selectinload(models.TreeNode.children))
-        .filter(models.TreeNode.id == node_id)
-    )
-    node = result.scalar_one_or_none()
+    node = await _node_response(db, node_id)
     if not node:
         raise NodeNotFoundException(node_id)
 
-    return schemas.TreeNodeResponse.model_validate(node)
+    return node
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -111,7 +415,7 @@ async def delete_all_nodes(db: AsyncSession) -> bool:
         bool: True if deletion is successful.
     """
     await db.execute(delete(models.TreeNode))
-    await db.commit()
+    await _commit_tree_write(db)
     return True
 
 
@@ -132,16 +436,73 @@ async def delete_node_by_id(db: AsyncSession, node_id: int) -> bool:
     Raises:
         NodeNotFoundException: If the node does not exist.
     """
+    await _lock_tree_for_write(db)
     result = await db.execute(select(models.TreeNode).filter(models.TreeNode.id == node_id))
     node = result.scalar_one_or_none()
     if not node:
         raise NodeNotFoundException(node_id)
 
+    # Children are detached to become roots; strip the deleted prefix from their subtrees
+    old_path = node.path
     await db.delete(node)
-    await db.commit()
+    await db.flush()
+    if old_path is not None:
+        await _rewrite_subtree_paths(db, old_path, "/")
+    await _commit_tree_write(db)
     return True
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Deletes a node and its entire subtree
+# ─────────────────────────────────────────────────────────────────────────────
+async def delete_subtree(db: AsyncSession, node_id: int) -> int:
+    """
+    Deletes a node and all of its descendants with one set-based statement.
+
+    The subtree is the materialized-path range of the node, so no ORM
+    objects are loaded and the cost does not depend on relationship loading.
+    A node whose path is not backfilled yet falls back to a recursive walk
+    over parent_id. Because parent and children go in the same statement,
+    the parent_id foreign key holds without needing ON DELETE CASCADE.
+
+    Parameters:
+        db (AsyncSession): The database session.
+        node_id (int): ID of the subtree root.
+
+    Returns:
+        int: Number of nodes deleted.
+
+    Raises:
+        NodeNotFoundException: If the node does not exist.
+    """
+    await _lock_tree_for_write(db)
+    result = await db.execute(select(models.TreeNode.id, models.TreeNode.path).where(models.TreeNode.id == node_id))
+    node = result.first()
+    if node is None:
+        raise NodeNotFoundException(node_id)
+
+    if node.path is not None:
+        result = await db.execute(
+            delete(models.TreeNode)
+            .where(_subtree_filter(node.path))
+            .execution_options(synchronize_session=False)
+        )
+        deleted = result.rowcount
+    else:
+        # Path not backfilled yet: collect the subtree through parent_id (UNION stops on cycles)
+        subtree = select(models.TreeNode.id).where(models.TreeNode.id == node_id).cte(name="subtree", recursive=True)
+        subtree = subtree.union(select(models.TreeNode.id).where(models.TreeNode.parent_id == subtree.c.id))
+        # Counted separately: SQLite reports no rowcount for a DELETE starting with WITH
+        deleted = (await db.execute(select(func.count()).select_from(subtree))).scalar()
+        await db.execute(
+            delete(models.TreeNode)
+            .where(models.TreeNode.id.in_(select(subtree.c.id)))
+            .execution_options(synchronize_session=False)
+        )
+    await _commit_tree_write(db)
+    return deleted
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Updates an existing node's label or parent
 # ─────────────────────────────────────────────────────────────────────────────
@@ -161,6 +522,8 @@ async def update_node(db: AsyncSession, node_id: int, data: schemas.TreeNodeCrea
         NodeNotFoundException: If the node to update doesn't exist.
         InvalidParentIDException: If new parent is invalid or causes cyclic relationship.
     """
+    await _lock_tree_for_write(db)
+
     # Fetch the node to update
     result = await db.execute(select(models.TreeNode).filter(models.TreeNode.id == node_id))
     node = result.scalar_one_or_none()
@@ -181,18 +544,104 @@ async def update_node(db: AsyncSession, node_id: int, data: schemas.TreeNodeCrea
         if not parent:
             raise InvalidParentIDException(data.parentId)
 
-        if await is_descendant(db, data.parentId, node_id):
+        # The parent's path lists all of its ancestors, so no extra query is needed
+        if parent.path is not None:
+            creates_cycle = f"/{node_id}/" in parent.path
+        else:
+            creates_cycle = await is_descendant(db, data.parentId, node_id)
+        if creates_cycle:
             raise InvalidParentIDException("Cannot set parentId to a descendant node.")
 
+        old_path = node.path
         node.parent_id = data.parentId
+        if old_path is not None:
+            await _rewrite_subtree_paths(db, old_path, node_path(parent.path, node_id))
 
     # Commit the changes
-    await db.commit()
-    await db.refresh(node)
+    await _commit_tree_write(db)
+
+    return await _node_response(db, node_id)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Applies many label changes and moves in a single transaction
+# ─────────────────────────────────────────────────────────────────────────────
+async def batch_update_nodes(db: AsyncSession, payload: schemas.TreeNodeBatchUpdate) -> schemas.TreeNodeBatchResult:
+    """
+    Applies many label changes and reparent moves atomically.
+
+    The target nodes and new parents are loaded with one query, and the
+    subtrees of moved nodes with another. The final parent graph is checked
+    for cycles once, in memory, with all moves applied together (so moves
+    may depend on each other). Changes are then written with grouped
+    executemany UPDATEs and a single commit.
 
-    # Re-fetch the updated node with eager-loaded children for validation
-    stmt = select(models.TreeNode).options(selectinload(models.TreeNode.children)).where(models.TreeNode.id == node_id)
-    result = await db.execute(stmt)
-    node_with_children = result.scalar_one()
+    Parameters:
+        db (AsyncSession): The database session.
+        payload (TreeNodeBatchUpdate): Changes to apply.
+
+    Returns:
+        TreeNodeBatchResult: Number of relabeled and moved nodes.
+
+    Raises:
+        NodeNotFoundException: If a node to update doesn't exist.
+        InvalidParentIDException: If a new parent is missing, is the node itself,
+            or the moves would create a cycle. Nothing is written in that case.
+    """
+    moves = {item.id: item.parentId for item in payload.updates if item.parentId is not None}
+    labels = {item.id: item.label for item in payload.updates if item.label}
+    for node_id, parent_id in moves.items():
+        if node_id == parent_id:
+            raise InvalidParentIDException("A node cannot be its own parent.")
+
+    # Lock before reading any path, so concurrent moves cannot leave stale prefixes
+    await _lock_tree_for_write(db)
+
+    # Load targets and new parents in one query
+    target_ids = {item.id for item in payload.updates}
+    result = await db.execute(
+        select(models.TreeNode.id, models.TreeNode.path)
+        .where(models.TreeNode.id.in_(target_ids | set(moves.values())))
+    )
+    old_paths = dict(result.all())
+    missing = target_ids - old_paths.keys()
+    if missing:
+        raise NodeNotFoundException(min(missing))
+    missing = set(moves.values()) - old_paths.keys()
+    if missing:
+        raise InvalidParentIDException(min(missing))
+
+    # Load every node whose path changes with the moved subtrees
+    if moves:
+        result = await db.execute(
+            select(models.TreeNode.id, models.TreeNode.path)
+            .where(or_(*(_subtree_filter(old_paths[node_id]) for node_id in moves)))
+        )
+        old_paths.update(result.all())
+
+    final_paths = resolve_moved_paths(moves, old_paths)
+
+    table = models.TreeNode.__table__
+    if labels:
+        await db.execute(
+            update(table).where(table.c.id == bindparam("node_id")).values(label=bindparam("node_label")),
+            [{"node_id": node_id, "node_label": label} for node_id, label in labels.items()],
+        )
+    if moves:
+        await db.execute(
+            update(table).where(table.c.id == bindparam("node_id")).values(parent_id=bindparam("new_parent_id")),
+            [{"node_id": node_id, "new_parent_id": parent_id} for node_id, parent_id in moves.items()],
+        )
+    changed_paths = [
+        {"node_id": node_id, "node_path": path}
+        for node_id, path in final_paths.items()
+        if path != old_paths[node_id]
+    ]
+    if changed_paths:
+        await db.execute(
+            update(table).where(table.c.id == bindparam("node_id")).values(path=bindparam("node_path")),
+            changed_paths,
+        )
+    await _commit_tree_write(db)
 
-    return schemas.TreeNodeResponse.model_validate(node_with_children)
+    return schemas.TreeNodeBatchResult(updated=len(labels), moved=len(moves))
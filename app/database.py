@@ -1,9 +1,17 @@
 # app/database.py
 
+import itertools
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import Request
+from sqlalchemy import event, make_url
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
+from app.cache import tree_cache
 
 # Load .env variables
 load_dotenv()
@@ -21,10 +29,87 @@ if DATABASE_URL.startswith("sqlite+aiosqlite:///./"):
     abs_path = os.path.join(base_dir, relative_path)
     DATABASE_URL = f"sqlite+aiosqlite:///{abs_path}"
 
-print(f"Using database: {DATABASE_URL}")
+logger = logging.getLogger(__name__)
+logger.info(f"Using database: {make_url(DATABASE_URL).render_as_string(hide_password=True)}")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Reads a true/false environment variable (1/true/yes/on)."""
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Engine profile, tuned per backend and overridable through env vars
+# ─────────────────────────────────────────────────────────────────────────────
+def engine_options(url: str) -> dict:
+    """
+    Builds create_async_engine() keyword arguments for the given database URL.
+
+    SQL echo is off unless SQL_ECHO is set. PostgreSQL gets a sized,
+    pre-pinged, recycled connection pool and a larger asyncpg prepared
+    statement cache. SQLite keeps SQLAlchemy's default pool; its pragmas
+    are applied per connection by _set_sqlite_pragmas().
+
+    Environment variables:
+        SQL_ECHO (bool): Log every SQL statement. Default false.
+        DB_POOL_SIZE (int): Persistent connections kept in the pool. Default 10.
+        DB_MAX_OVERFLOW (int): Extra connections allowed under load. Default 20.
+        DB_POOL_TIMEOUT (int): Seconds to wait for a free connection. Default 30.
+        DB_POOL_RECYCLE (int): Seconds before a connection is replaced. Default 1800.
+        DB_POOL_PRE_PING (bool): Test connections on checkout. Default true.
+        ASYNCPG_STATEMENT_CACHE_SIZE (int): Prepared statements cached per connection. Default 500.
+
+    Parameters:
+        url (str): The SQLAlchemy database URL.
+
+    Returns:
+        dict: Keyword arguments for create_async_engine().
+    """
+    options = {"echo": _env_bool("SQL_ECHO", False)}
+    if url.startswith("sqlite"):
+        return options
+
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+    )
+    if "+asyncpg" in url:
+        options["connect_args"] = {
+            "prepared_statement_cache_size": int(os.getenv("ASYNCPG_STATEMENT_CACHE_SIZE", "500")),
+        }
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Applies SQLite pragmas to every new connection.
+
+    WAL lets readers proceed while a write is in progress, synchronous=NORMAL
+    is safe under WAL and avoids an fsync per commit, and mmap serves reads
+    from the page cache. Configurable with SQLITE_JOURNAL_MODE (default WAL),
+    SQLITE_SYNCHRONOUS (default NORMAL) and SQLITE_MMAP_SIZE in bytes
+    (default 256 MiB; 0 disables).
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={os.getenv('SQLITE_JOURNAL_MODE', 'WAL')}")
+    cursor.execute(f"PRAGMA synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    cursor.execute(f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 2 ** 20)))}")
+    cursor.close()
+
+
+def make_engine(url: str):
+    """Creates an async engine with the engine profile (and pragmas, for SQLite) for url."""
+    async_engine = create_async_engine(url, **engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return async_engine
+
 
 # Create async engine
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+engine = make_engine(DATABASE_URL)
 
 # Async session
 AsyncSessionLocal = sessionmaker(
@@ -40,3 +125,88 @@ Base = declarative_base()
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Read replicas: round-robin sessions for read-only endpoints
+# ─────────────────────────────────────────────────────────────────────────────
+# Comma-separated replica URLs, e.g. postgresql+asyncpg://ro@replica-1/tree,...
+REPLICA_URLS = [url.strip() for url in os.getenv("REPLICA_URLS", "").split(",") if url.strip()]
+# After a write, reads go to the primary for this long (read-your-writes)
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+# A replica that fails to connect is skipped for this long
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+# Cookie set on mutating responses; holds the time until which reads stick to the primary
+STICKY_COOKIE = "tree_read_primary_until"
+
+replica_engines = [make_engine(url) for url in REPLICA_URLS]
+ReplicaSessionLocals = [
+    sessionmaker(bind=replica, class_=AsyncSession, expire_on_commit=False) for replica in replica_engines
+]
+_replica_order = itertools.cycle(range(len(ReplicaSessionLocals)))
+_replica_down_until = {}
+
+
+def prefers_primary(request: Request | None = None) -> bool:
+    """
+    Whether a read should go to the primary to observe a recent write.
+
+    True within REPLICA_STICKY_SECONDS of a write made through this process
+    (so the tree cache is never filled from a lagging replica), or while
+    the client's sticky cookie from a write on any worker is still valid.
+
+    Parameters:
+        request (Request | None): Incoming request, checked for the sticky cookie.
+    """
+    if time.monotonic() - tree_cache.invalidated_at < REPLICA_STICKY_SECONDS:
+        return True
+    if request is not None:
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+    return False
+
+
+@asynccontextmanager
+async def read_session(prefer_primary: bool = False):
+    """
+    Opens a session for read-only queries on the next healthy replica.
+
+    Replicas are tried in round-robin order; one that cannot be connected to
+    is skipped for REPLICA_RETRY_SECONDS. Falls back to the primary when no
+    replica is configured or reachable, or when prefer_primary is set.
+
+    Parameters:
+        prefer_primary (bool): Read from the primary (e.g. right after a write).
+
+    Yields:
+        AsyncSession: A session bound to a replica or to the primary.
+    """
+    if not prefer_primary:
+        for _ in range(len(ReplicaSessionLocals)):
+            index = next(_replica_order)
+            if _replica_down_until.get(index, 0) > time.monotonic():
+                continue
+            session = ReplicaSessionLocals[index]()
+            try:
+                await session.connection()
+            except (OSError, SQLAlchemyError) as e:
+                await session.close()
+                _replica_down_until[index] = time.monotonic() + REPLICA_RETRY_SECONDS
+                logger.warning(f"Read replica {index} unavailable, skipping for {REPLICA_RETRY_SECONDS}s: {e}")
+                continue
+            try:
+                yield session
+            finally:
+                await session.close()
+            return
+
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+# Dependency for read-only endpoints
+async def get_read_db(request: Request):
+    async with read_session(prefer_primary=prefers_primary(request)) as session:
+        yield session
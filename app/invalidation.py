@@ -0,0 +1,183 @@
+# app/invalidation.py
+#
+# Cross-process tree cache invalidation, for running several workers or
+# instances against one database. Every write transaction bumps the shared
+# tree_version row (bump_tree_version). Each process follows that version
+# and drops its cached trees when another process moves it forward:
+#
+#   - PostgreSQL (asyncpg): the bump also sends NOTIFY on TREE_VERSION_CHANNEL,
+#     which is delivered on commit, and each process LISTENs on a dedicated
+#     connection. The version is re-read after every (re)connect and every
+#     TREE_VERSION_RECHECK_SECONDS, to catch notifications missed meanwhile.
+#   - Other databases (SQLite for local development and tests): the version
+#     row is polled every TREE_VERSION_POLL_SECONDS.
+
+import asyncio
+import logging
+import os
+from contextlib import suppress
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from app.cache import tree_cache
+from app.database import engine
+from app.metrics import TREE_INVALIDATIONS
+from app.models import tree_version
+
+logger = logging.getLogger(__name__)
+
+# "auto" (LISTEN/NOTIFY on PostgreSQL with asyncpg, polling otherwise), "notify", "poll" or "off"
+TREE_INVALIDATION = os.getenv("TREE_INVALIDATION", "auto").strip().lower()
+# Polling interval, also used while the LISTEN connection is down
+TREE_VERSION_POLL_SECONDS = float(os.getenv("TREE_VERSION_POLL_SECONDS", "1"))
+# How often the version is re-read on the LISTEN connection as a safety net
+TREE_VERSION_RECHECK_SECONDS = float(os.getenv("TREE_VERSION_RECHECK_SECONDS", "30"))
+TREE_VERSION_CHANNEL = "tree_version"
+
+
+async def bump_tree_version(db: AsyncSession) -> int | None:
+    """
+    Increments the shared tree version inside the caller's write transaction.
+
+    The row lock orders concurrent writers, and the new value only becomes
+    visible (and, on PostgreSQL, is only notified) once the write commits.
+
+    Parameters:
+        db (AsyncSession): Session holding the uncommitted write.
+
+    Returns:
+        int | None: The new version, or None if the counter row is missing (schema not upgraded).
+    """
+    result = await db.execute(
+        update(tree_version).values(version=tree_version.c.version + 1).returning(tree_version.c.version)
+    )
+    version = result.scalar()
+    if version is not None and db.bind.dialect.name == "postgresql":
+        await db.execute(select(func.pg_notify(TREE_VERSION_CHANNEL, str(version))))
+    return version
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Per-process follower of the shared tree version
+# ─────────────────────────────────────────────────────────────────────────────
+class TreeVersionListener:
+    """
+    Follows the shared tree version and invalidates the local tree cache when it moves.
+
+    Attributes:
+        version (int | None): Latest tree version this process has caught up with.
+        mode (str | None): "notify" or "poll" once started; None when disabled.
+    """
+
+    def __init__(self, async_engine: AsyncEngine):
+        self.engine = async_engine
+        self.version = None
+        self.mode = None
+        self._task = None
+        self._poll_failing = False
+
+    def observe(self, version: int | None, source: str):
+        """
+        Invalidates the tree cache if version is newer than the last one seen.
+
+        The first version observed only sets the baseline.
+
+        Parameters:
+            version (int | None): Tree version read or notified.
+            source (str): "notify" or "poll", for metrics.
+        """
+        if version is None or (self.version is not None and version <= self.version):
+            return
+        previous, self.version = self.version, version
+        if previous is not None:
+            tree_cache.invalidate(notify=False)
+            TREE_INVALIDATIONS.inc(source=source)
+
+    def observe_local(self, version: int | None):
+        """Records the version of a write by this process, whose cache was already invalidated."""
+        if version is not None and self.version is not None and version == self.version + 1:
+            self.version = version
+
+    async def read_version(self) -> int | None:
+        """Reads the current tree version through the engine's pool."""
+        async with self.engine.connect() as conn:
+            return (await conn.execute(select(tree_version.c.version))).scalar()
+
+    async def poll_once(self):
+        """Reads the version and applies it; failures are logged once until the next success."""
+        try:
+            self.observe(await self.read_version(), "poll")
+        except Exception as e:
+            if not self._poll_failing:
+                logger.warning(f"Could not read tree version: {e}")
+            self._poll_failing = True
+        else:
+            self._poll_failing = False
+
+    async def start(self):
+        """Reads the baseline version and starts following it in a background task."""
+        if TREE_INVALIDATION == "off":
+            return
+        self.mode = TREE_INVALIDATION
+        if self.mode == "auto":
+            listen = self.engine.dialect.name == "postgresql" and self.engine.dialect.driver == "asyncpg"
+            self.mode = "notify" if listen else "poll"
+        await self.poll_once()
+        self._task = asyncio.create_task(self._listen() if self.mode == "notify" else self._poll())
+
+    async def stop(self):
+        """Stops the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(TREE_VERSION_POLL_SECONDS)
+            await self.poll_once()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            self.observe(int(payload), "notify")
+        except ValueError:
+            logger.warning(f"Ignoring malformed {TREE_VERSION_CHANNEL} notification: {payload!r}")
+
+    async def _listen(self):
+        """LISTENs on a dedicated asyncpg connection, polling while it cannot be (re)established."""
+        import asyncpg  # only needed on PostgreSQL
+
+        # A plain asyncpg DSN for the same database as the engine
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        connect_failing = False
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn)
+            except (OSError, asyncpg.PostgresError) as e:
+                if not connect_failing:
+                    logger.warning(f"Tree version LISTEN connection failed, polling until it is back: {e}")
+                connect_failing = True
+                await self.poll_once()
+                await asyncio.sleep(TREE_VERSION_POLL_SECONDS)
+                continue
+            connect_failing = False
+
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(TREE_VERSION_CHANNEL, self._on_notify)
+                while not lost.is_set():
+                    # Catch up on writes notified while not listening, then re-check periodically
+                    self.observe(await connection.fetchval("SELECT version FROM tree_version"), "poll")
+                    with suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(lost.wait(), TREE_VERSION_RECHECK_SECONDS)
+                logger.warning("Tree version LISTEN connection lost, reconnecting")
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning(f"Tree version LISTEN connection failed, reconnecting: {e}")
+            finally:
+                connection.terminate()
+            await self.poll_once()
+            await asyncio.sleep(TREE_VERSION_POLL_SECONDS)
+
+
+tree_version_listener = TreeVersionListener(engine)
@@ -1,11 +1,45 @@
 # app/main.py
 
+from app.startup import startup_timer
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-from app.database import engine, Base
-from app.api import tree
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.database import engine, replica_engines, REPLICA_URLS, REPLICA_STICKY_SECONDS, STICKY_COOKIE
+from app import metrics
+from app.profiling import PROFILE_ENABLED, profile_requests
+from app.migrations import ensure_schema
+from app.invalidation import tree_version_listener
+from app.api import auth, tree
 from app.exceptions import InvalidParentIDException, NodeNotFoundException
 import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# "marker" skips the schema upgrade when the database's schema version matches; "always" runs it on every boot
+STARTUP_SCHEMA_CHECK = os.getenv("STARTUP_SCHEMA_CHECK", "marker")
+# Load the full tree into the cache in the background right after startup
+PREWARM_TREE_CACHE = os.getenv("PREWARM_TREE_CACHE", "false").strip().lower() in ("1", "true", "yes", "on")
+
+startup_timer.mark("imports")
+
+
+def configure_logging():
+    """
+    Send the application's logs (startup timing, cache pre-warm, ...) to stderr at LOG_LEVEL.
+
+    Runs from the startup hook rather than at import time, and only when
+    nothing has configured logging yet (e.g. uvicorn --log-config, pytest).
+    Only the "app" loggers are set up, so third-party loggers keep their levels.
+    """
+    app_logger = logging.getLogger("app")
+    if logging.getLogger().handlers or app_logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(levelname)s:     %(name)s - %(message)s"))
+    app_logger.addHandler(handler)
+    app_logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Initialize FastAPI app
@@ -13,12 +47,71 @@ import asyncio
 app = FastAPI()
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Startup event: create tables asynchronously if not present
+# Startup event: apply pending schema migrations, start following writes made
+# by other processes, optionally pre-warm the cache, and log how long each
+# startup phase took
 # ─────────────────────────────────────────────────────────────────────────────
 @app.on_event("startup")
 async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    configure_logging()
+    with startup_timer.phase("schema"):
+        upgraded = await ensure_schema(engine, force=STARTUP_SCHEMA_CHECK == "always")
+    await tree_version_listener.start()
+    if PREWARM_TREE_CACHE:
+        # Keep a reference so the task is not garbage collected while it runs
+        app.state.prewarm_task = asyncio.create_task(tree.prewarm_tree_cache())
+    logger.info(
+        f"Startup complete ({'schema upgraded' if upgraded else 'schema up to date'}): {startup_timer.report()}"
+    )
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await tree_version_listener.stop()
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Opt-in request profiling (PROFILE_ENABLED); not installed at all when off.
+# Registered first so it runs inside the metrics middleware and sees its stats.
+# ─────────────────────────────────────────────────────────────────────────────
+if PROFILE_ENABLED:
+    app.middleware("http")(profile_requests)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Metrics: SQL statement counts/latency per engine, request latency per route
+# ─────────────────────────────────────────────────────────────────────────────
+for instrumented_engine in (engine, *replica_engines):
+    metrics.instrument_engine(instrumented_engine)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    startup_timer.first_request()
+    db_stats = metrics.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    # Label by route template (/api/tree/{node_id}), not the raw path
+    route_path = metrics.route_label(request.scope)
+    metrics.REQUEST_LATENCY.observe(elapsed, method=request.method, route=route_path, status=response.status_code)
+    metrics.DB_QUERIES_PER_REQUEST.observe(db_stats["queries"], method=request.method, route=route_path)
+    metrics.DB_TIME_PER_REQUEST.observe(db_stats["db_seconds"], method=request.method, route=route_path)
+    return response
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Read-your-writes: after a successful write, pin the client's reads to the
+# primary for REPLICA_STICKY_SECONDS (only when read replicas are configured)
+# ─────────────────────────────────────────────────────────────────────────────
+@app.middleware("http")
+async def replica_stickiness(request: Request, call_next):
+    response = await call_next(request)
+    if REPLICA_URLS and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        response.set_cookie(
+            STICKY_COOKIE,
+            f"{time.time() + REPLICA_STICKY_SECONDS:.3f}",
+            max_age=max(1, int(REPLICA_STICKY_SECONDS)),
+            httponly=True,
+            samesite="lax",
+        )
+    return response
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Root route
@@ -27,6 +120,13 @@ async def on_startup():
 def read_root():
     return {"message": "Tree API is running! Visit /docs for Swagger UI."}
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Prometheus metrics
+# ─────────────────────────────────────────────────────────────────────────────
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Exception handlers
 # ─────────────────────────────────────────────────────────────────────────────
@@ -42,3 +142,4 @@ async def node_not_found_handler(request: Request, exc: NodeNotFoundException):
 # Register routes
 # ─────────────────────────────────────────────────────────────────────────────
 app.include_router(tree.router, prefix="/api")
+app.include_router(auth.router, prefix="/api")
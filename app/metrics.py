@@ -0,0 +1,254 @@
+# app/metrics.py
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from sqlalchemy import event
+from app.cache import tree_cache
+
+# Default latency buckets in seconds, from 1 ms to 10 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=()) -> str:
+    """Formats label pairs as {a="x",b="y"} (empty string when there are none)."""
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Minimal metric types rendered in the Prometheus text exposition format
+# ─────────────────────────────────────────────────────────────────────────────
+class Counter:
+    """
+    Monotonic counter, optionally split by labels.
+
+    Attributes:
+        name (str): Metric name.
+        documentation (str): HELP text.
+        labelnames (tuple[str]): Label names, given as keyword arguments to inc().
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """Replaces the value, e.g. to mirror a count kept elsewhere."""
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    type = "gauge"
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values, optionally split by labels.
+
+    Attributes:
+        name (str): Metric name.
+        documentation (str): HELP text.
+        labelnames (tuple[str]): Label names, given as keyword arguments to observe().
+        buckets (tuple[float]): Upper bounds of the buckets (+Inf is implicit).
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip((*self.buckets, float("inf")), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    samples.append((f"{self.name}_bucket", key, (("le", le),), cumulative))
+                samples.append((f"{self.name}_sum", key, (), total))
+                samples.append((f"{self.name}_count", key, (), cumulative))
+        return samples
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Metrics exported on /metrics
+# ─────────────────────────────────────────────────────────────────────────────
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request.", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent executing SQL per HTTP request.", ("method", "route")
+)
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Latency of individual SQL statements.")
+TREE_STAGE_LATENCY = Histogram(
+    "tree_stage_duration_seconds", "Time spent per tree read stage (query, build, encode).", ("stage",)
+)
+TREE_SIZE = Histogram(
+    "tree_size_nodes", "Number of nodes in trees built for responses.",
+    buckets=(1, 10, 100, 1_000, 10_000, 100_000, 1_000_000),
+)
+SINGLEFLIGHT_LOADS = Counter(
+    "tree_singleflight_loads_total", "Tree loads started on a cache miss.", ("kind",)
+)
+SINGLEFLIGHT_COALESCED = Counter(
+    "tree_singleflight_coalesced_total", "Requests that joined a tree load already in flight.", ("kind",)
+)
+TREE_INVALIDATIONS = Counter(
+    "tree_cache_remote_invalidations_total", "Tree cache invalidations caused by writes in other processes.", ("source",)
+)
+CACHE_HITS = Counter("tree_cache_hits_total", "Tree cache lookups served from the cache.")
+CACHE_MISSES = Counter("tree_cache_misses_total", "Tree cache lookups that had to be rebuilt.")
+CACHE_HIT_RATIO = Gauge("tree_cache_hit_ratio", "Share of tree cache lookups served from the cache.")
+CACHE_ENTRIES = Gauge("tree_cache_entries", "Entries currently held in the tree cache.")
+CACHE_NODES = Gauge("tree_cache_nodes", "Nodes currently held in the tree cache.")
+
+REGISTRY = [
+    REQUEST_LATENCY, DB_QUERIES_PER_REQUEST, DB_TIME_PER_REQUEST, DB_QUERY_LATENCY,
+    TREE_STAGE_LATENCY, TREE_SIZE, SINGLEFLIGHT_LOADS, SINGLEFLIGHT_COALESCED, TREE_INVALIDATIONS,
+    CACHE_HITS, CACHE_MISSES, CACHE_HIT_RATIO, CACHE_ENTRIES, CACHE_NODES,
+]
+
+
+def render() -> str:
+    """
+    Renders every registered metric in the Prometheus text exposition format.
+
+    Cache gauges are refreshed from tree_cache.stats() at scrape time.
+    """
+    stats = tree_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    CACHE_HITS.set(stats["hits"])
+    CACHE_MISSES.set(stats["misses"])
+    CACHE_HIT_RATIO.set(stats["hits"] / lookups if lookups else 0.0)
+    CACHE_ENTRIES.set(stats["entries"])
+    CACHE_NODES.set(stats["nodes"])
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, key, extra, value in metric.samples():
+            lines.append(f"{name}{_format_labels(metric.labelnames, key, extra)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Per-request and per-stage timing
+# ─────────────────────────────────────────────────────────────────────────────
+# Counters for the request being handled, if any (see start_request)
+_request_stats: ContextVar = ContextVar("request_stats", default=None)
+
+
+def start_request() -> dict:
+    """
+    Starts collecting statistics for the current request and returns them.
+
+    The dict is filled in while the request runs: "queries" and "db_seconds"
+    by the SQLAlchemy events, "tree_nodes" by record_tree_size().
+    """
+    stats = {"queries": 0, "db_seconds": 0.0, "tree_nodes": None}
+    _request_stats.set(stats)
+    return stats
+
+
+def current_request_stats() -> dict | None:
+    """Returns the statistics of the request being handled, if one was started."""
+    return _request_stats.get()
+
+
+def record_tree_size(nodes: int):
+    """Records the size of a tree built for the current request."""
+    TREE_SIZE.observe(nodes)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats["tree_nodes"] = nodes
+
+
+def route_label(scope: dict) -> str:
+    """
+    Returns the matched route template (e.g. /api/tree/{node_id}) for a request scope.
+
+    The route template of an included router lacks the router prefix, which
+    is recovered from the part of the raw path before the rendered route.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    path = scope["path"]
+    rendered = route.path_format.format(**{name: str(value) for name, value in scope.get("path_params", {}).items()})
+    prefix = path[:-len(rendered)] if rendered and path.endswith(rendered) else ""
+    return prefix + route.path
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block as one tree read stage (e.g. "query", "build", "encode")."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TREE_STAGE_LATENCY.observe(time.perf_counter() - start, stage=name)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    DB_QUERY_LATENCY.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats["queries"] += 1
+        stats["db_seconds"] += elapsed
+
+
+def instrument_engine(async_engine):
+    """Records count and latency of every SQL statement run through async_engine."""
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(async_engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
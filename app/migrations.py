@@ -0,0 +1,185 @@
+# app/migrations.py
+
+import asyncio
+import logging
+import sys
+from sqlalchemy import inspect, text, select, update, delete, insert, bindparam, Table, Column, Integer
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.database import engine, Base
+from app import models
+from app.utils import node_path
+
+logger = logging.getLogger(__name__)
+
+# Number of rows written per executemany batch during backfill
+BACKFILL_BATCH_SIZE = 10000
+
+# Version of the schema produced by upgrade(); bump it whenever upgrade() gains
+# a step, so databases stamped with an older version run the upgrade once more
+# (2: tree_version counter row)
+SCHEMA_VERSION = 2
+
+# Single-row marker recording the SCHEMA_VERSION a database was last upgraded to
+schema_version = Table("schema_version", Base.metadata, Column("version", Integer, nullable=False))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Adds columns and indexes introduced after the nodes table was first created
+# ─────────────────────────────────────────────────────────────────────────────
+def _add_path_column(sync_conn) -> bool:
+    """
+    Adds the `path` column to a `nodes` table created before it existed.
+
+    Parameters:
+        sync_conn (Connection): Synchronous connection (via run_sync).
+
+    Returns:
+        bool: True if the column was added, False if it was already present.
+    """
+    columns = {column["name"] for column in inspect(sync_conn).get_columns("nodes")}
+    if "path" in columns:
+        return False
+
+    path_type = models.TreeNode.__table__.c.path.type.compile(dialect=sync_conn.dialect)
+    sync_conn.execute(text(f"ALTER TABLE nodes ADD COLUMN path {path_type}"))
+    return True
+
+
+def _create_indexes(sync_conn):
+    """
+    Creates any index declared on the nodes table that is missing in the database.
+
+    Parameters:
+        sync_conn (Connection): Synchronous connection (via run_sync).
+    """
+    for index in models.TreeNode.__table__.indexes:
+        index.create(sync_conn, checkfirst=True)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Recomputes the materialized path of every node reachable from a root
+# ─────────────────────────────────────────────────────────────────────────────
+async def backfill_paths(conn: AsyncConnection) -> int:
+    """
+    Recomputes the materialized path of every node reachable from a root.
+
+    Nodes are visited breadth-first from the roots, so each parent's path is
+    known before its children. Orphaned rows (whose parent no longer exists)
+    are not part of any tree and keep a null path.
+
+    Parameters:
+        conn (AsyncConnection): Connection inside an open transaction.
+
+    Returns:
+        int: Number of nodes whose path was written.
+    """
+    result = await conn.execute(select(models.TreeNode.id, models.TreeNode.parent_id))
+    children_map = {}
+    for node_id, parent_id in result:
+        children_map.setdefault(parent_id, []).append(node_id)
+
+    await conn.execute(update(models.TreeNode).values(path=None))
+
+    paths = []
+    queue = [(node_id, None) for node_id in children_map.get(None, [])]
+    while queue:
+        next_queue = []
+        for node_id, parent_path in queue:
+            path = node_path(parent_path, node_id)
+            paths.append({"node_id": node_id, "node_path": path})
+            next_queue.extend((child_id, path) for child_id in children_map.get(node_id, []))
+        queue = next_queue
+
+    table = models.TreeNode.__table__
+    stmt = update(table).where(table.c.id == bindparam("node_id")).values(path=bindparam("node_path"))
+    for start in range(0, len(paths), BACKFILL_BATCH_SIZE):
+        await conn.execute(stmt, paths[start:start + BACKFILL_BATCH_SIZE])
+
+    return len(paths)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Brings an existing database up to the current schema
+# ─────────────────────────────────────────────────────────────────────────────
+async def upgrade(conn: AsyncConnection, backfill: bool = False):
+    """
+    Brings an existing database up to the current schema.
+
+    Creates missing tables, adds columns introduced after the first release,
+    creates missing indexes, backfills materialized paths when the path
+    column is new (or when explicitly requested), and seeds the tree_version
+    counter row. Safe to run repeatedly.
+
+    Parameters:
+        conn (AsyncConnection): Connection inside an open transaction.
+        backfill (bool): Force a full path backfill even if the column exists.
+    """
+    await conn.run_sync(Base.metadata.create_all)
+    added_path = await conn.run_sync(_add_path_column)
+    await conn.run_sync(_create_indexes)
+
+    if added_path or backfill:
+        count = await backfill_paths(conn)
+        logger.info(f"Backfilled materialized paths for {count} nodes")
+
+    if (await conn.execute(select(models.tree_version.c.version))).first() is None:
+        await conn.execute(insert(models.tree_version).values(version=0))
+
+    await conn.execute(delete(schema_version))
+    await conn.execute(insert(schema_version).values(version=SCHEMA_VERSION))
+
+
+async def read_schema_version(conn: AsyncConnection) -> int | None:
+    """
+    Reads the schema version marker with one cheap query (no reflection).
+
+    Parameters:
+        conn (AsyncConnection): Connection to query; its transaction should be discarded on failure.
+
+    Returns:
+        int | None: The stamped version, or None if the marker table does not exist yet.
+    """
+    try:
+        return (await conn.execute(select(schema_version.c.version))).scalar()
+    except DBAPIError:
+        return None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Startup entry point: upgrade only when the schema marker is out of date
+# ─────────────────────────────────────────────────────────────────────────────
+async def ensure_schema(async_engine: AsyncEngine, force: bool = False) -> bool:
+    """
+    Runs upgrade() unless the database is already stamped with SCHEMA_VERSION.
+
+    Checking the marker is a single SELECT, so warm restarts skip
+    create_all and the reflection done by the upgrade steps.
+
+    Parameters:
+        async_engine (AsyncEngine): Engine of the primary database.
+        force (bool): Run the upgrade even if the marker matches.
+
+    Returns:
+        bool: True if upgrade() ran, False if it was skipped.
+    """
+    if not force:
+        async with async_engine.connect() as conn:
+            if await read_schema_version(conn) == SCHEMA_VERSION:
+                return False
+
+    async with async_engine.begin() as conn:
+        await upgrade(conn)
+    return True
+
+
+async def main(argv):
+    """Command line entry point: `python -m app.migrations [backfill]`."""
+    async with engine.begin() as conn:
+        await upgrade(conn, backfill="backfill" in argv)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(sys.argv[1:]))
@@ -1,6 +1,6 @@
 # app/models.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, Index, Table
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -27,6 +27,14 @@ class TreeNode(Base):
     # ─────────────────────────────────────────────────────────────────────────
     parent_id = Column(Integer, ForeignKey("nodes.id"), nullable=True)
 
+    # ─────────────────────────────────────────────────────────────────────────
+    # Materialized path of ancestor IDs ending with the node's own ID,
+    # e.g. "/1/5/9/". A subtree is the contiguous range of paths sharing a
+    # prefix. Byte-wise ("C") collation on PostgreSQL keeps range scans and
+    # ordering consistent with SQLite. Null until backfilled by migrations.
+    # ─────────────────────────────────────────────────────────────────────────
+    path = Column(String().with_variant(String(collation="C"), "postgresql"), nullable=True)
+
     # ─────────────────────────────────────────────────────────────────────────
     # Reference to the parent node
     # remote_side=[id] helps SQLAlchemy resolve the self-referential direction
@@ -37,3 +45,22 @@ class TreeNode(Base):
     # - `remote_side=[id]` is required to resolve ambiguity in self-reference
     # - `backref="children"` creates a reverse-access relationship
     # - `lazy="selectin"` allows async-safe eager loading for nested tree access
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Secondary indexes (created on existing databases by app.migrations)
+    # - (parent_id, id) serves child lookups and returns children ordered by id;
+    #   its leading column also covers lookups by parent_id alone
+    # - path serves subtree range scans
+    # ─────────────────────────────────────────────────────────────────────────
+    __table_args__ = (
+        Index("ix_nodes_parent_id_id", "parent_id", "id"),
+        Index("ix_nodes_path", "path"),
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Single-row counter bumped inside every write transaction (see
+# app.invalidation). Workers follow it to drop trees cached before a write
+# made by another process.
+# ─────────────────────────────────────────────────────────────────────────────
+tree_version = Table("tree_version", Base.metadata, Column("version", BigInteger, nullable=False))
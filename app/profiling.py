@@ -0,0 +1,156 @@
+# app/profiling.py
+
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+from threading import Lock
+from fastapi import Request
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+# Profiling is off unless PROFILE_ENABLED is set; the middleware is then not installed at all
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+# When > 0, every request is profiled and kept only if slower than this many milliseconds
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "0"))
+# Fraction of requests profiled and always kept
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Requests carrying this header are profiled and kept; its value must match PROFILE_TOKEN when one is set
+PROFILE_HEADER = "x-profile"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# "pyinstrument" (.html, async-aware), "cprofile" (stdlib, .prof files for pstats/snakeviz),
+# or "auto": pyinstrument when it is installed, cProfile otherwise
+PROFILER = os.getenv("PROFILER", "auto").strip().lower()
+
+# Both profilers hook the whole event-loop thread, so only one request is profiled at a time.
+# cProfile also records every other request running meanwhile; pyinstrument's async mode
+# only attributes time to the profiled request's own task.
+_profile_lock = Lock()
+
+
+def _profile_reason(request: Request) -> str | None:
+    """Returns why this request should be profiled ("header", "sample", "threshold"), or None."""
+    header = request.headers.get(PROFILE_HEADER)
+    if header is not None and (not PROFILE_TOKEN or header == PROFILE_TOKEN):
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sample"
+    if PROFILE_THRESHOLD_MS > 0:
+        return "threshold"
+    return None
+
+
+def _start_profiler():
+    """Starts the configured profiler (pyinstrument if selected or auto and installed, else cProfile)."""
+    if PROFILER in ("auto", "pyinstrument"):
+        try:
+            # Imported on first use; optional and only needed for pyinstrument profiles
+            from pyinstrument import Profiler
+        except ImportError:
+            if PROFILER == "pyinstrument":
+                logger.warning("PROFILER=pyinstrument but pyinstrument is not installed; using cProfile")
+        else:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            return profiler
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+
+def _save_profile(profiler, metadata: dict):
+    """Writes the profile and a JSON metadata sidecar to PROFILE_DIR."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = re.sub(r"[^A-Za-z0-9]+", "_", metadata["route"]).strip("_") or "root"
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    base = os.path.join(PROFILE_DIR, f"{stamp}-{metadata['method']}-{route}-{metadata['elapsed_ms']:.0f}ms")
+
+    if isinstance(profiler, cProfile.Profile):
+        metadata["profiler"] = "cprofile"
+        metadata["profile"] = base + ".prof"
+        profiler.dump_stats(metadata["profile"])
+    else:
+        metadata["profiler"] = "pyinstrument"
+        metadata["profile"] = base + ".html"
+        with open(metadata["profile"], "w") as f:
+            f.write(profiler.output_html())
+
+    with open(base + ".json", "w") as f:
+        json.dump(metadata, f, indent=2)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Middleware: profile slow, sampled or explicitly requested requests
+# ─────────────────────────────────────────────────────────────────────────────
+async def profile_requests(request: Request, call_next):
+    """
+    Profiles a request and stores the profile when it is worth keeping.
+
+    Requests with the X-Profile header and sampled requests are always
+    kept; with PROFILE_THRESHOLD_MS set, every other request is profiled
+    but only kept if it was slower than the threshold. Each profile is
+    saved with route, status, latency, SQL statement count and tree size.
+    Streaming responses are profiled up to their first byte.
+
+    Only pyinstrument profiles are limited to this request. cProfile records
+    the whole event-loop thread, so its profile also contains every request
+    that ran concurrently, even though it is saved under this request's
+    route, latency and SQL count.
+
+    Parameters:
+        request (Request): Incoming request.
+        call_next (Callable): Next handler in the middleware chain.
+
+    Returns:
+        Response: The response of the wrapped handler, unchanged.
+    """
+    reason = _profile_reason(request)
+    if reason is None or not _profile_lock.acquire(blocking=False):
+        return await call_next(request)
+
+    try:
+        profiler = _start_profiler()
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            _stop_profiler(profiler)
+    finally:
+        _profile_lock.release()
+
+    if reason != "threshold" or elapsed_ms >= PROFILE_THRESHOLD_MS:
+        stats = metrics.current_request_stats() or {}
+        metadata = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "reason": reason,
+            "method": request.method,
+            "route": metrics.route_label(request.scope),
+            "path": request.url.path,
+            "query": request.url.query,
+            "status": response.status_code,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "db_queries": stats.get("queries"),
+            "db_ms": round(stats.get("db_seconds", 0.0) * 1000, 3),
+            "tree_nodes": stats.get("tree_nodes"),
+        }
+        try:
+            await asyncio.to_thread(_save_profile, profiler, metadata)
+        except OSError as e:
+            logger.warning(f"Could not save request profile to {PROFILE_DIR}: {e}")
+    return response
@@ -1,5 +1,5 @@
-from typing import List, Optional, Union
-from pydantic import BaseModel, ConfigDict
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, model_serializer, model_validator
 
 # ────────────────────────────────────────────────────────────────
 # Input schema for creating or updating a node
@@ -17,6 +17,81 @@ class TreeNodeCreate(BaseModel):
     parentId: Optional[int] = None
 
 
+# ────────────────────────────────────────────────────────────────
+# Input schema for bulk node creation
+# Used in POST /tree/bulk
+# ────────────────────────────────────────────────────────────────
+class TreeNodeBulkItem(BaseModel):
+    """
+    Schema representing one node of a bulk import, optionally with nested children.
+
+    Fields:
+        tempId (Optional[str]): Client-side temporary ID, needed only if other items refer to it.
+        label (str): Required label or name of the node.
+        parentId (Optional[int]): ID of an existing node to attach to.
+        parentTempId (Optional[str]): tempId of another item in the same request to attach to.
+        children (List[TreeNodeBulkItem]): Nested children, implicitly parented to this node.
+    """
+    tempId: Optional[str] = None
+    label: str
+    parentId: Optional[int] = None
+    parentTempId: Optional[str] = None
+    children: List["TreeNodeBulkItem"] = []
+
+    @model_validator(mode="after")
+    def check_single_parent(self):
+        if self.parentId is not None and self.parentTempId is not None:
+            raise ValueError("Only one of parentId and parentTempId may be set.")
+        for child in self.children:
+            if child.parentId is not None or child.parentTempId is not None:
+                raise ValueError("Nested children must not set parentId or parentTempId.")
+        return self
+
+
+class TreeNodeBulkCreate(BaseModel):
+    """
+    Schema representing a bulk import payload: a flat list, nested trees, or both.
+
+    Fields:
+        nodes (List[TreeNodeBulkItem]): Top-level items to create; at least one.
+    """
+    nodes: List[TreeNodeBulkItem] = Field(min_length=1)
+
+
+# ────────────────────────────────────────────────────────────────
+# Input schema for batch updates and moves
+# Used in PUT /tree/batch
+# ────────────────────────────────────────────────────────────────
+class TreeNodeBatchUpdateItem(BaseModel):
+    """
+    Schema representing one change within a batch update.
+
+    Fields:
+        id (int): ID of the node to change.
+        label (Optional[str]): New label; unchanged if omitted.
+        parentId (Optional[int]): New parent ID; unchanged if omitted.
+    """
+    id: int
+    label: Optional[str] = None
+    parentId: Optional[int] = None
+
+
+class TreeNodeBatchUpdate(BaseModel):
+    """
+    Schema representing a batch of label changes and moves applied atomically.
+
+    Fields:
+        updates (List[TreeNodeBatchUpdateItem]): Changes to apply, at most one per node.
+    """
+    updates: List[TreeNodeBatchUpdateItem]
+
+    @model_validator(mode="after")
+    def check_unique_ids(self):
+        if len({item.id for item in self.updates}) != len(self.updates):
+            raise ValueError("Each node may appear only once in a batch.")
+        return self
+
+
 # ────────────────────────────────────────────────────────────────
 # Output schema for a single node with recursive children
 # Used in GET responses (/tree, /tree/{id})
@@ -29,13 +104,27 @@ class TreeNodeResponse(BaseModel):
         id (int): Unique identifier of the node.
         label (str): Label or name of the node.
         children (List[TreeNodeResponse]): List of child nodes.
+        hasChildren (Optional[bool]): Set only on nodes at the cut frontier of a
+            depth-limited read (or in a children page); omitted otherwise.
+        childCount (Optional[int]): Number of direct children, set with hasChildren.
     """
     id: int
     label: str
     children: List["TreeNodeResponse"] = []
+    hasChildren: Optional[bool] = None
+    childCount: Optional[int] = None
 
     model_config = ConfigDict(from_attributes=True)
 
+    @model_serializer(mode="wrap")
+    def _omit_unset_markers(self, handler):
+        """Leaves hasChildren/childCount out of the output unless they are set."""
+        data = handler(self)
+        for key in ("hasChildren", "childCount"):
+            if data.get(key) is None:
+                data.pop(key, None)
+        return data
+
 
 # ────────────────────────────────────────────────────────────────
 # Output schema for DELETE ALL operation
@@ -52,6 +141,68 @@ class TreeNodeDeleteAll(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+# ────────────────────────────────────────────────────────────────
+# Output schema for a cascading subtree delete
+# Used in DELETE /tree/{id}?cascade=true response
+# ────────────────────────────────────────────────────────────────
+class TreeNodeDeleteSubtree(BaseModel):
+    """
+    Schema representing the result of deleting a node with its subtree.
+
+    Fields:
+        deletedCount (int): Number of nodes removed, including the subtree root.
+    """
+    deletedCount: int
+
+
+# ────────────────────────────────────────────────────────────────
+# Output schema for one page of a node's direct children
+# Used in GET /tree/{id}/children response
+# ────────────────────────────────────────────────────────────────
+class TreeNodeChildrenPage(BaseModel):
+    """
+    Schema representing one page of a node's direct children, ordered by ID.
+
+    Fields:
+        items (List[TreeNodeResponse]): Children on this page, with hasChildren/childCount set.
+        nextCursor (Optional[int]): Cursor for the next page, or None on the last page.
+    """
+    items: List[TreeNodeResponse]
+    nextCursor: Optional[int] = None
+
+
+# ────────────────────────────────────────────────────────────────
+# Output schema for bulk node creation
+# Used in POST /tree/bulk response
+# ────────────────────────────────────────────────────────────────
+class TreeNodeBulkResult(BaseModel):
+    """
+    Schema representing the outcome of a bulk import.
+
+    Fields:
+        created (int): Number of nodes created.
+        idMap (Dict[str, int]): Database ID assigned to each tempId given in the request.
+    """
+    created: int
+    idMap: Dict[str, int]
+
+
+# ────────────────────────────────────────────────────────────────
+# Output schema for batch updates
+# Used in PUT /tree/batch response
+# ────────────────────────────────────────────────────────────────
+class TreeNodeBatchResult(BaseModel):
+    """
+    Schema representing the outcome of a batch update.
+
+    Fields:
+        updated (int): Number of nodes whose label changed.
+        moved (int): Number of nodes given a new parent.
+    """
+    updated: int
+    moved: int
+
+
 # ────────────────────────────────────────────────────────────────
 # Generic response wrapper for all API responses
 # Applies to all endpoints for consistency in responses
@@ -71,6 +222,10 @@ class ResponseWrapper(BaseModel):
         TreeNodeResponse,
         List[TreeNodeResponse],
         TreeNodeDeleteAll,
+        TreeNodeDeleteSubtree,
+        TreeNodeChildrenPage,
+        TreeNodeBulkResult,
+        TreeNodeBatchResult,
         bool,
         None
     ]
@@ -81,3 +236,4 @@ class ResponseWrapper(BaseModel):
 # Required when a model refers to itself (TreeNodeResponse.children)
 # ────────────────────────────────────────────────────────────────
 TreeNodeResponse.model_rebuild()
+TreeNodeBulkItem.model_rebuild()
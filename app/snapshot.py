@@ -0,0 +1,181 @@
+# app/snapshot.py
+#
+# Shared, memory-mapped tree snapshot for multi-worker deployments (e.g.
+# uvicorn --workers N). The worker that builds the CompactTree from the
+# database writes it to TREE_SNAPSHOT_DIR; every worker on the host maps that
+# file read-only, so they share one copy in the page cache and a freshly
+# started worker serves the tree without querying or rebuilding it.
+#
+# A generation counter file, bumped by every write, stamps each snapshot and
+# tells workers when the snapshot and their local caches are out of date.
+# Snapshots are also stamped with the shared tree version (app.invalidation),
+# so a write made on another host retires them too.
+
+import fcntl
+import logging
+import mmap
+import os
+import tempfile
+from threading import Lock
+from app.cache import tree_cache
+from app.utils import CompactTree
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the shared snapshot; unset disables snapshots (each worker builds its own tree)
+TREE_SNAPSHOT_DIR = os.getenv("TREE_SNAPSHOT_DIR", "").strip()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Snapshot file and write generation shared by the workers on one host
+# ─────────────────────────────────────────────────────────────────────────────
+class TreeSnapshotStore:
+    """
+    Publishes and maps the shared CompactTree snapshot in one directory.
+
+    Files:
+        generation: Decimal write counter, replaced atomically under a lock.
+        tree.snap: Latest snapshot (see CompactTree.write_snapshot), stamped
+            with the generation it was built at and replaced atomically.
+
+    A snapshot is only used when its generation equals the current one and
+    its tree version is at least the one the caller knows, so a tree loaded
+    before a concurrent write is never served after it.
+
+    Attributes:
+        directory (str): Directory holding the files.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "tree.snap")
+        self.generation_path = os.path.join(directory, "generation")
+        self._lock_path = os.path.join(directory, "generation.lock")
+        self._generation_stat = None
+        self._generation = 0
+        self._seen_generation = None
+        self._mapped = None  # ((generation, tree_version), CompactTree) currently mapped by this process
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def generation(self) -> int:
+        """Returns the current write generation (one stat() call unless it changed)."""
+        try:
+            stat = os.stat(self.generation_path)
+        except FileNotFoundError:
+            return 0
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._generation_stat:
+            try:
+                with open(self.generation_path) as f:
+                    self._generation = int(f.read() or 0)
+            except (FileNotFoundError, ValueError):
+                return self._generation
+            self._generation_stat = key
+        return self._generation
+
+    def bump(self):
+        """
+        Moves to a new generation; called after every committed write.
+
+        The write is already committed, so a failure is logged rather than
+        raised; other workers then catch up on their next rebuild.
+        """
+        try:
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    generation = self.generation() + 1
+                    self._replace(self.generation_path, lambda f: f.write(str(generation).encode()))
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.warning(f"Could not bump tree snapshot generation in {self.directory}: {e}")
+            return
+        # This process already invalidated its cache for the write; don't do it again in sync()
+        if self._seen_generation == generation - 1:
+            self._seen_generation = generation
+
+    def sync(self):
+        """
+        Invalidates the local tree cache if another worker wrote since the last call.
+
+        Cheap enough to run on every cached read (one stat() when unchanged).
+        """
+        generation = self.generation()
+        if self._seen_generation is not None and generation != self._seen_generation:
+            tree_cache.invalidate(notify=False)
+        self._seen_generation = generation
+
+    def load(self, generation: int, tree_version: int = 0) -> CompactTree | None:
+        """
+        Returns the snapshot tree for generation, mapping tree.snap if needed.
+
+        Parameters:
+            generation (int): Generation the caller needs, from generation().
+            tree_version (int): Oldest shared tree version the caller accepts.
+
+        Returns:
+            CompactTree | None: The mapped tree, or None if the file is missing or out of date.
+        """
+
+        def current(stamp):
+            return stamp is not None and stamp[0] == generation and stamp[1] >= tree_version
+
+        with self._lock:
+            if self._mapped is not None and current(self._mapped[0]):
+                return self._mapped[1]
+            try:
+                with open(self.snapshot_path, "rb") as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        return None
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                return None
+            stamp = CompactTree.read_snapshot_stamp(buffer)
+            if not current(stamp):
+                buffer.close()
+                return None
+            # The memoryviews keep the mapping alive, also after tree.snap is replaced
+            tree = CompactTree.from_snapshot(buffer)
+            self._mapped = (stamp, tree)
+            return tree
+
+    def publish(self, tree: CompactTree, generation: int, tree_version: int = 0):
+        """
+        Writes tree as the snapshot for generation, replacing tree.snap atomically.
+
+        Readers that have the previous file mapped keep a consistent view of it.
+
+        Parameters:
+            tree (CompactTree): Tree built from the database at generation.
+            generation (int): Generation read before the tree was loaded.
+            tree_version (int): Shared tree version known before the tree was loaded.
+        """
+        self._replace(self.snapshot_path, lambda f: tree.write_snapshot(f, generation, tree_version))
+
+    def _replace(self, path: str, write):
+        """Writes a temporary file in the same directory and renames it over path."""
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def _open_store() -> TreeSnapshotStore | None:
+    if not TREE_SNAPSHOT_DIR:
+        return None
+    try:
+        store = TreeSnapshotStore(TREE_SNAPSHOT_DIR)
+    except OSError as e:
+        logger.warning(f"Tree snapshots disabled, cannot use {TREE_SNAPSHOT_DIR}: {e}")
+        return None
+    tree_cache.listeners.append(store.bump)
+    return store
+
+
+snapshot_store = _open_store()
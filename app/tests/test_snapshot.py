@@ -0,0 +1,81 @@
+# test_snapshot.py
+
+import tempfile
+from collections import namedtuple
+from app.cache import tree_cache
+from app.snapshot import TreeSnapshotStore
+from app.utils import CompactTree
+
+Row = namedtuple("Row", ["id", "label", "parent_id"])
+
+# Dense IDs get an array index, sparse ones a dict index
+DENSE_ROWS = [Row(1, "root", None), Row(2, "a", 1), Row(3, "b", 1), Row(4, "ä-leaf", 2), Row(5, "other-root", None)]
+SPARSE_ROWS = [Row(7, "root", None), Row(10 ** 12, "far", 7), Row(3, "near", 10 ** 12)]
+
+
+def assert_same_tree(loaded, original, ids):
+    assert list(loaded.rows()) == list(original.rows())
+    assert loaded.to_nested() == original.to_nested()
+    for node_id in ids:
+        assert loaded.index_of(node_id) == original.index_of(node_id)
+        assert loaded.depth(node_id) == original.depth(node_id)
+    assert loaded.index_of(999) == original.index_of(999) == -1
+
+
+def test_snapshot_round_trip_dense_and_dict_index():
+    for rows, dict_index in ((DENSE_ROWS, False), (SPARSE_ROWS, True)):
+        original = CompactTree.from_rows(rows)
+        assert isinstance(original._positions, dict) == dict_index
+        with tempfile.TemporaryDirectory() as directory:
+            store = TreeSnapshotStore(directory)
+            store.publish(original, generation=0, tree_version=3)
+            loaded = TreeSnapshotStore(directory).load(0, 3)
+            assert loaded is not None
+            assert isinstance(loaded._positions, dict) == isinstance(original._positions, dict)
+            assert_same_tree(loaded, original, [row.id for row in rows])
+            del loaded
+    print("test_snapshot_round_trip_dense_and_dict_index passed")
+
+
+def test_snapshot_load_rejects_stale_generation_or_version():
+    tree = CompactTree.from_rows(DENSE_ROWS)
+    with tempfile.TemporaryDirectory() as directory:
+        store = TreeSnapshotStore(directory)
+        assert store.load(store.generation()) is None  # nothing published yet
+
+        generation = store.generation()
+        store.publish(tree, generation, tree_version=5)
+        assert store.load(generation, 5) is not None
+        assert store.load(generation, 4) is not None
+        assert store.load(generation, 6) is None
+
+        store.bump()
+        assert store.generation() == generation + 1
+        assert TreeSnapshotStore(directory).load(store.generation(), 5) is None
+        assert store.load(store.generation(), 5) is None
+    print("test_snapshot_load_rejects_stale_generation_or_version passed")
+
+
+def test_sync_invalidates_after_bump_from_another_store():
+    with tempfile.TemporaryDirectory() as directory:
+        reader, writer = TreeSnapshotStore(directory), TreeSnapshotStore(directory)
+        reader.sync()
+        version = tree_cache.version
+
+        writer.bump()
+        reader.sync()
+        assert tree_cache.version == version + 1
+        reader.sync()
+        assert tree_cache.version == version + 1  # only once per write
+
+        # A store's own bump does not invalidate again in sync()
+        reader.bump()
+        reader.sync()
+        assert tree_cache.version == version + 1
+    print("test_sync_invalidates_after_bump_from_another_store passed")
+
+
+if __name__ == "__main__":
+    test_snapshot_round_trip_dense_and_dict_index()
+    test_snapshot_load_rejects_stale_generation_or_version()
+    test_sync_invalidates_after_bump_from_another_store()
@@ -1,5 +1,7 @@
 # test_tree.py
 
+import json
+import asyncio
 import httpx
 
 # Toggle between environments:
@@ -134,9 +136,408 @@ def test_cannot_create_circular_relationship():
         print("test_cannot_create_circular_relationship passed")
 
 
+def test_get_subtree_returns_nested_descendants_only():
+    # Create root -> child -> grandchild, plus an unrelated root
+    root_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "subtree-root"}).json()["data"]["id"]
+    child_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "subtree-child", "parentId": root_id}).json()["data"]["id"]
+    grandchild_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "subtree-grandchild", "parentId": child_id}).json()["data"]["id"]
+    other_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "subtree-other"}).json()["data"]["id"]
+
+    try:
+        res = httpx.get(f"{BASE_URL}/api/tree/{child_id}")
+        assert res.status_code == 200
+        child_data = res.json()["data"]
+        assert child_data["id"] == child_id
+        assert [c["id"] for c in child_data["children"]] == [grandchild_id]
+        assert find_node([child_data], root_id) is None
+        assert find_node([child_data], other_id) is None
+
+        missing = httpx.get(f"{BASE_URL}/api/tree/999999")
+        assert missing.status_code == 404
+    finally:
+        for node_id in (grandchild_id, child_id, root_id, other_id):
+            httpx.delete(f"{BASE_URL}/api/tree/{node_id}")
+        print("test_get_subtree_returns_nested_descendants_only passed")
+
+
+def test_cannot_move_node_under_deep_descendant():
+    # Create A -> B -> C
+    id_a = httpx.post(f"{BASE_URL}/api/tree", json={"label": "A"}).json()["data"]["id"]
+    id_b = httpx.post(f"{BASE_URL}/api/tree", json={"label": "B", "parentId": id_a}).json()["data"]["id"]
+    id_c = httpx.post(f"{BASE_URL}/api/tree", json={"label": "C", "parentId": id_b}).json()["data"]["id"]
+
+    try:
+        # Moving A under its grandchild C would create a cycle
+        res_update = httpx.put(f"{BASE_URL}/api/tree/{id_a}", json={"label": "A", "parentId": id_c})
+        assert res_update.status_code == 400
+        assert "descendant" in res_update.text.lower()
+
+        # Moving C directly under A is allowed
+        res_move = httpx.put(f"{BASE_URL}/api/tree/{id_c}", json={"label": "C", "parentId": id_a})
+        assert res_move.status_code == 200
+    finally:
+        for node_id in (id_c, id_b, id_a):
+            httpx.delete(f"{BASE_URL}/api/tree/{node_id}")
+        print("test_cannot_move_node_under_deep_descendant passed")
+
+
+def test_tree_reads_reflect_writes():
+    node_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "cache-before"}).json()["data"]["id"]
+
+    try:
+        # Read twice so the second response can be served from the cache
+        httpx.get(f"{BASE_URL}/api/tree")
+        httpx.get(f"{BASE_URL}/api/tree/{node_id}")
+        assert find_node(httpx.get(f"{BASE_URL}/api/tree").json()["data"], node_id)["label"] == "cache-before"
+
+        # A write must invalidate cached full-tree and subtree reads
+        httpx.put(f"{BASE_URL}/api/tree/{node_id}", json={"label": "cache-after"})
+        assert find_node(httpx.get(f"{BASE_URL}/api/tree").json()["data"], node_id)["label"] == "cache-after"
+        assert httpx.get(f"{BASE_URL}/api/tree/{node_id}").json()["data"]["label"] == "cache-after"
+    finally:
+        httpx.delete(f"{BASE_URL}/api/tree/{node_id}")
+
+    assert find_node(httpx.get(f"{BASE_URL}/api/tree").json()["data"], node_id) is None
+    print("test_tree_reads_reflect_writes passed")
+
+
+def test_tree_etag_revalidation():
+    node_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "etag-node"}).json()["data"]["id"]
+
+    try:
+        first = httpx.get(f"{BASE_URL}/api/tree")
+        etag = first.headers.get("etag")
+        assert first.status_code == 200 and etag
+
+        # Unchanged tree: the client's copy is still current
+        not_modified = httpx.get(f"{BASE_URL}/api/tree", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+
+        # Any write changes the representation and its ETag
+        httpx.put(f"{BASE_URL}/api/tree/{node_id}", json={"label": "etag-node-renamed"})
+        changed = httpx.get(f"{BASE_URL}/api/tree", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+
+        subtree = httpx.get(f"{BASE_URL}/api/tree/{node_id}")
+        assert httpx.get(
+            f"{BASE_URL}/api/tree/{node_id}", headers={"If-None-Match": subtree.headers["etag"]}
+        ).status_code == 304
+    finally:
+        httpx.delete(f"{BASE_URL}/api/tree/{node_id}")
+        print("test_tree_etag_revalidation passed")
+
+
+def test_export_tree_streams_ndjson_and_nested_json():
+    root_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "export-root"}).json()["data"]["id"]
+    child_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "export-child", "parentId": root_id}).json()["data"]["id"]
+
+    try:
+        ndjson = httpx.get(f"{BASE_URL}/api/tree/export", params={"format": "ndjson", "batch_size": 1})
+        assert ndjson.status_code == 200
+        rows = [json.loads(line) for line in ndjson.text.splitlines()]
+        assert {"id": child_id, "label": "export-child", "parentId": root_id} in rows
+        assert [row["id"] for row in rows].index(root_id) < [row["id"] for row in rows].index(child_id)
+
+        # Nested export must match the regular tree response
+        nested = httpx.get(f"{BASE_URL}/api/tree/export", params={"format": "json", "batch_size": 1})
+        assert nested.status_code == 200
+        exported_root = find_node(nested.json()["data"], root_id)
+        assert exported_root == find_node(httpx.get(f"{BASE_URL}/api/tree").json()["data"], root_id)
+    finally:
+        httpx.delete(f"{BASE_URL}/api/tree/{child_id}")
+        httpx.delete(f"{BASE_URL}/api/tree/{root_id}")
+        print("test_export_tree_streams_ndjson_and_nested_json passed")
+
+
+def sort_children_by_id(node):
+    """Returns a copy of node with children sorted by ID at every level."""
+    return {**node, "children": sorted((sort_children_by_id(c) for c in node["children"]), key=lambda c: c["id"])}
+
+
+def test_export_matches_tree_up_to_sibling_order():
+    root_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "order-root"}).json()["data"]["id"]
+    # Enough children for sibling IDs to cross a power of ten (e.g. 999 and 1000),
+    # where string order (export) and numeric order (GET /tree) differ
+    count = max(3, 10 ** len(str(root_id)) - root_id + 2)
+    items = [{"tempId": f"o{i}", "label": f"order-{i}", "parentId": root_id} for i in range(count)]
+    items.append({"tempId": "grandchild", "label": "order-grandchild", "parentTempId": "o0"})
+    res = httpx.post(f"{BASE_URL}/api/tree/bulk", json={"nodes": items}, timeout=60)
+    assert res.status_code == 201
+
+    try:
+        tree_root = httpx.get(f"{BASE_URL}/api/tree/{root_id}", timeout=60).json()["data"]
+        child_ids = [child["id"] for child in tree_root["children"]]
+        assert child_ids == sorted(child_ids)
+        assert len(str(child_ids[0])) < len(str(child_ids[-1]))
+
+        nested = httpx.get(f"{BASE_URL}/api/tree/export", params={"format": "json"}, timeout=60)
+        exported_root = find_node(nested.json()["data"], root_id)
+        assert [child["id"] for child in exported_root["children"]] == sorted(child_ids, key=str)
+        assert sort_children_by_id(exported_root) == sort_children_by_id(tree_root)
+
+        ndjson = httpx.get(f"{BASE_URL}/api/tree/export", timeout=60)
+        rows = [json.loads(line) for line in ndjson.text.splitlines()]
+        exported_ids = {row["id"] for row in rows if row["id"] in set(child_ids) | {root_id}}
+        assert exported_ids == set(child_ids) | {root_id}
+    finally:
+        httpx.delete(f"{BASE_URL}/api/tree/{root_id}", params={"cascade": "true"})
+        print("test_export_matches_tree_up_to_sibling_order passed")
+
+
+def test_depth_limited_read_and_children_pagination():
+    # Create root with three children, the first of which has a grandchild
+    root_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "depth-root"}).json()["data"]["id"]
+    child_ids = [
+        httpx.post(f"{BASE_URL}/api/tree", json={"label": f"depth-child-{i}", "parentId": root_id}).json()["data"]["id"]
+        for i in range(3)
+    ]
+    grandchild_id = httpx.post(
+        f"{BASE_URL}/api/tree", json={"label": "depth-grandchild", "parentId": child_ids[0]}
+    ).json()["data"]["id"]
+
+    try:
+        # depth=1 returns root and children only, with markers on the frontier
+        res = httpx.get(f"{BASE_URL}/api/tree/{root_id}", params={"depth": 1})
+        assert res.status_code == 200
+        root = res.json()["data"]
+        assert "childCount" not in root
+        assert [c["id"] for c in root["children"]] == child_ids
+        assert root["children"][0]["children"] == []
+        assert root["children"][0]["hasChildren"] is True and root["children"][0]["childCount"] == 1
+        assert root["children"][1]["hasChildren"] is False and root["children"][1]["childCount"] == 0
+
+        # depth=0 on the full tree returns roots only
+        roots = httpx.get(f"{BASE_URL}/api/tree", params={"depth": 0}).json()["data"]
+        assert find_node(roots, root_id)["childCount"] == 3
+        assert find_node(roots, grandchild_id) is None
+
+        # Page through children two at a time
+        page1 = httpx.get(f"{BASE_URL}/api/tree/{root_id}/children", params={"limit": 2}).json()["data"]
+        assert [c["id"] for c in page1["items"]] == child_ids[:2]
+        assert page1["items"][0]["childCount"] == 1
+        page2 = httpx.get(
+            f"{BASE_URL}/api/tree/{root_id}/children", params={"limit": 2, "cursor": page1["nextCursor"]}
+        ).json()["data"]
+        assert [c["id"] for c in page2["items"]] == child_ids[2:]
+        assert page2["nextCursor"] is None
+
+        assert httpx.get(f"{BASE_URL}/api/tree/999999/children").status_code == 404
+    finally:
+        for node_id in [grandchild_id, *child_ids, root_id]:
+            httpx.delete(f"{BASE_URL}/api/tree/{node_id}")
+        print("test_depth_limited_read_and_children_pagination passed")
+
+
+def test_bulk_create_nested_and_flat_items():
+    root_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "bulk-existing"}).json()["data"]["id"]
+    payload = {
+        "nodes": [
+            {"tempId": "a", "label": "bulk-a", "parentId": root_id, "children": [
+                {"tempId": "a1", "label": "bulk-a1"},
+            ]},
+            {"tempId": "b", "label": "bulk-b", "parentTempId": "a1"},
+        ]
+    }
+    id_map = {}
+
+    try:
+        res = httpx.post(f"{BASE_URL}/api/tree/bulk", json=payload)
+        assert res.status_code == 201
+        data = res.json()["data"]
+        assert data["created"] == 3
+        id_map = data["idMap"]
+
+        root = httpx.get(f"{BASE_URL}/api/tree/{root_id}").json()["data"]
+        node_a = root["children"][0]
+        assert node_a["id"] == id_map["a"]
+        assert node_a["children"][0]["id"] == id_map["a1"]
+        assert node_a["children"][0]["children"][0]["id"] == id_map["b"]
+
+        # Invalid references are rejected and nothing is created
+        bad = httpx.post(f"{BASE_URL}/api/tree/bulk", json={"nodes": [
+            {"tempId": "x", "label": "bulk-x"},
+            {"label": "bulk-y", "parentTempId": "missing"},
+        ]})
+        assert bad.status_code == 400
+        cycle = httpx.post(f"{BASE_URL}/api/tree/bulk", json={"nodes": [
+            {"tempId": "p", "label": "bulk-p", "parentTempId": "q"},
+            {"tempId": "q", "label": "bulk-q", "parentTempId": "p"},
+        ]})
+        assert cycle.status_code == 400
+        # An empty import is rejected rather than committed as a (cache-clearing) no-op write
+        empty = httpx.post(f"{BASE_URL}/api/tree/bulk", json={"nodes": []})
+        assert empty.status_code == 422
+        tree = httpx.get(f"{BASE_URL}/api/tree").json()["data"]
+        assert not any(node["label"] == "bulk-x" for node in tree)
+    finally:
+        for node_id in [*reversed(list(id_map.values())), root_id]:
+            httpx.delete(f"{BASE_URL}/api/tree/{node_id}")
+        print("test_bulk_create_nested_and_flat_items passed")
+
+
+def test_batch_update_moves_and_relabels_atomically():
+    # Create A -> B, plus a separate root C
+    id_a = httpx.post(f"{BASE_URL}/api/tree", json={"label": "batch-A"}).json()["data"]["id"]
+    id_b = httpx.post(f"{BASE_URL}/api/tree", json={"label": "batch-B", "parentId": id_a}).json()["data"]["id"]
+    id_c = httpx.post(f"{BASE_URL}/api/tree", json={"label": "batch-C"}).json()["data"]["id"]
+
+    try:
+        # Swap A and B (B moves under C, A under B) and relabel C, in one batch
+        res = httpx.put(f"{BASE_URL}/api/tree/batch", json={"updates": [
+            {"id": id_b, "parentId": id_c},
+            {"id": id_a, "parentId": id_b},
+            {"id": id_c, "label": "batch-C-renamed"},
+        ]})
+        assert res.status_code == 200
+        assert res.json()["data"] == {"updated": 1, "moved": 2}
+
+        node_c = httpx.get(f"{BASE_URL}/api/tree/{id_c}").json()["data"]
+        assert node_c["label"] == "batch-C-renamed"
+        assert node_c["children"][0]["id"] == id_b
+        assert node_c["children"][0]["children"][0]["id"] == id_a
+
+        # A cycle anywhere in the batch rejects the whole batch
+        cycle = httpx.put(f"{BASE_URL}/api/tree/batch", json={"updates": [
+            {"id": id_c, "label": "batch-C-cycle"},
+            {"id": id_b, "parentId": id_a},
+        ]})
+        assert cycle.status_code == 400
+        assert httpx.get(f"{BASE_URL}/api/tree/{id_c}").json()["data"]["label"] == "batch-C-renamed"
+    finally:
+        for node_id in (id_a, id_b, id_c):
+            httpx.delete(f"{BASE_URL}/api/tree/{node_id}")
+        print("test_batch_update_moves_and_relabels_atomically passed")
+
+
+def test_cascade_delete_removes_whole_subtree():
+    root_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "cascade-root"}).json()["data"]["id"]
+    child_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "cascade-child", "parentId": root_id}).json()["data"]["id"]
+    httpx.post(f"{BASE_URL}/api/tree", json={"label": "cascade-grandchild", "parentId": child_id})
+
+    res = httpx.delete(f"{BASE_URL}/api/tree/{child_id}", params={"cascade": "true"})
+    assert res.status_code == 200
+    assert res.json()["data"] == {"deletedCount": 2}
+
+    root = httpx.get(f"{BASE_URL}/api/tree/{root_id}").json()["data"]
+    assert root["children"] == []
+    assert httpx.get(f"{BASE_URL}/api/tree/{child_id}").status_code == 404
+    assert httpx.delete(f"{BASE_URL}/api/tree/{child_id}", params={"cascade": "true"}).status_code == 404
+
+    assert httpx.delete(f"{BASE_URL}/api/tree/{root_id}", params={"cascade": "true"}).json()["data"] == {"deletedCount": 1}
+    print("test_cascade_delete_removes_whole_subtree passed")
+
+
+def test_deep_chain_reads_and_updates():
+    depth = 1500  # deeper than Python's default recursion limit
+    items = [
+        {"tempId": f"deep-{i}", "label": f"deep-{i}", "parentTempId": f"deep-{i - 1}" if i else None}
+        for i in range(depth)
+    ]
+    res = httpx.post(f"{BASE_URL}/api/tree/bulk", json={"nodes": items}, timeout=60)
+    assert res.status_code == 201
+    id_map = res.json()["data"]["idMap"]
+    root_id = id_map["deep-0"]
+
+    # Too deep for the client's json module too, so check the raw body
+    res = httpx.get(f"{BASE_URL}/api/tree/{root_id}", timeout=60)
+    assert res.status_code == 200
+    assert res.content.count(b'"children":[{') == depth - 1
+
+    # Updating a node with grandchildren returns it with one level of children
+    res = httpx.put(f"{BASE_URL}/api/tree/{root_id}", json={"label": "deep-root"})
+    assert res.status_code == 200
+    child = res.json()["data"]["children"][0]
+    assert child["id"] == id_map["deep-1"]
+    assert child["hasChildren"] is True and child["childCount"] == 1
+
+    assert httpx.delete(f"{BASE_URL}/api/tree/{root_id}", params={"cascade": "true"}).json()["data"] == {"deletedCount": depth}
+    print("test_deep_chain_reads_and_updates passed")
+
+
+def test_node_responses_omit_unset_child_markers():
+    res = httpx.post(f"{BASE_URL}/api/tree", json={"label": "marker-root"})
+    assert res.status_code == 201
+    root = res.json()["data"]
+    assert "hasChildren" not in root and "childCount" not in root
+
+    res = httpx.put(f"{BASE_URL}/api/tree/{root['id']}", json={"label": "marker-root-renamed"})
+    assert res.status_code == 200
+    assert "hasChildren" not in res.json()["data"]
+
+    # The response schemas must still render in the OpenAPI document
+    res = httpx.get(f"{BASE_URL}/openapi.json")
+    assert res.status_code == 200
+    assert "hasChildren" in res.json()["components"]["schemas"]["TreeNodeResponse"]["properties"]
+
+    assert httpx.delete(f"{BASE_URL}/api/tree/{root['id']}").status_code == 200
+    print("test_node_responses_omit_unset_child_markers passed")
+
+
+def test_metrics_endpoint_exposes_prometheus_text():
+    httpx.get(f"{BASE_URL}/api/tree")
+
+    res = httpx.get(f"{BASE_URL}/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    body = res.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/tree",status="200"}' in body
+    assert 'db_queries_per_request_count{method="GET",route="/api/tree"}' in body
+    assert "tree_cache_hit_ratio" in body
+    print("test_metrics_endpoint_exposes_prometheus_text passed")
+
+
+def test_concurrent_tree_reads_share_one_load():
+    root_id = httpx.post(f"{BASE_URL}/api/tree", json={"label": "coalesce-root"}).json()["data"]["id"]
+
+    async def read_concurrently():
+        async with httpx.AsyncClient(base_url=BASE_URL) as client:
+            return await asyncio.gather(*[client.get("/api/tree") for _ in range(10)])
+
+    responses = asyncio.run(read_concurrently())
+    assert {res.status_code for res in responses} == {200}
+    assert len({res.headers["etag"] for res in responses}) == 1
+    assert len({res.content for res in responses}) == 1
+
+    metrics_text = httpx.get(f"{BASE_URL}/metrics").text
+    assert 'tree_singleflight_loads_total{kind="json"}' in metrics_text
+
+    httpx.delete(f"{BASE_URL}/api/tree/{root_id}")
+    print("test_concurrent_tree_reads_share_one_load passed")
+
+
+def test_login_issues_bearer_token():
+    res = httpx.post(f"{BASE_URL}/api/login", data={"username": "admin", "password": "wrong"})
+    assert res.status_code == 401
+
+    res = httpx.post(f"{BASE_URL}/api/login", data={"username": "admin", "password": "password"})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["token_type"] == "bearer"
+    assert body["access_token"].count(".") == 2
+    print("test_login_issues_bearer_token passed")
+
+
 if __name__ == "__main__":
     test_non_intrusive_flow()
     test_update_parent_and_validate_tree()
     test_cannot_set_node_as_its_own_parent()
     test_create_with_invalid_parent_id()
     test_cannot_create_circular_relationship()
+    test_get_subtree_returns_nested_descendants_only()
+    test_cannot_move_node_under_deep_descendant()
+    test_tree_reads_reflect_writes()
+    test_tree_etag_revalidation()
+    test_export_tree_streams_ndjson_and_nested_json()
+    test_export_matches_tree_up_to_sibling_order()
+    test_depth_limited_read_and_children_pagination()
+    test_bulk_create_nested_and_flat_items()
+    test_batch_update_moves_and_relabels_atomically()
+    test_cascade_delete_removes_whole_subtree()
+    test_deep_chain_reads_and_updates()
+    test_node_responses_omit_unset_child_markers()
+    test_metrics_endpoint_exposes_prometheus_text()
+    test_concurrent_tree_reads_share_one_load()
+    test_login_issues_bearer_token()
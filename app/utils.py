@@ -1,19 +1,32 @@
 # app/utils.py
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import and_, or_, select, literal
 from app import models
+from app.exceptions import InvalidParentIDException
+from array import array
 from collections import defaultdict
+import json
+import struct
+import sys
+
+# Upper bound on ancestor walks; guards against runaway recursion on corrupt data.
+# A walk that reaches it is treated as a cycle (fail closed), see is_descendant()
+MAX_TREE_DEPTH = 10000
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Constructs tree hierarchy from flat list of nodes in O(n)
 # ─────────────────────────────────────────────────────────────────────────────
-def build_tree(nodes):
+def build_tree(nodes, child_counts=None):
     """
     Constructs tree hierarchy from flat list of nodes in O(n).
 
     :param nodes: List of TreeNode objects.
-    :return: Tree as nested list of dictionaries.
+    :param child_counts: Optional {id: count} for nodes whose children were not
+                         loaded (the frontier of a depth-limited read); those
+                         nodes get "hasChildren" and "childCount" keys.
+    :return: Tuple of (roots, index): the tree as a nested list of dictionaries,
+             and {id: node dict} for O(1) lookup of any subtree.
     """
     children_map = defaultdict(list)
     id_to_node = {}
@@ -28,66 +41,570 @@ def build_tree(nodes):
     for node in id_to_node.values():
         node["children"] = children_map.get(node["id"], [])
 
-    return children_map[None]
+    for node_id, count in (child_counts or {}).items():
+        id_to_node[node_id]["hasChildren"] = count > 0
+        id_to_node[node_id]["childCount"] = count
+
+    return children_map[None], id_to_node
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Checks if a node is a descendant of another (async version)
+# Compact array-backed tree for large in-memory trees
 # ─────────────────────────────────────────────────────────────────────────────
-async def is_descendant(db: AsyncSession, descendant_id: int, ancestor_id: int) -> bool:
+class CompactTree:
     """
-    Checks if a node is a descendant of another to prevent cyclic parent-child relationships.
+    Array-backed tree storing nodes in depth-first pre-order.
 
-    :param db: Async SQLAlchemy DB session.
-    :param descendant_id: Potential child node.
-    :param ancestor_id: Potential ancestor node.
-    :return: True if descendant_id is under ancestor_id.
+    Instead of a dict and a list per node, each node is one slot in a few
+    parallel arrays. Because nodes are in pre-order, the subtree of the node
+    at position i is the contiguous slice [i, i + sizes[i]), and its children
+    are found by hopping over their subtree sizes (first-child/next-sibling
+    without storing either). Labels are stored once, as a UTF-8 blob.
+
+    Nodes that are not reachable from a root (orphans) are left out, as in
+    build_tree().
+
+    Attributes:
+        ids (array): Node ID at each position.
+        parents (array): Position of the parent node, -1 for roots.
+        sizes (array): Number of nodes in the subtree at each position (including itself).
+        depths (array): Depth of each node, 0 for roots.
+        label_offsets (array): Start of each label in label_blob; len(ids) + 1 entries.
+        label_blob (bytes): All labels, UTF-8 encoded and concatenated.
+    """
+
+    # Snapshot header: magic, generation, tree version, node count, label bytes, min ID,
+    # dense index length (0 = none)
+    SNAPSHOT_HEADER = struct.Struct("<8sQQQQqQ")
+    SNAPSHOT_MAGIC = b"TREESNP2"
+
+    def __init__(self, ids, parents, sizes, depths, label_offsets, label_blob, positions=None, min_id=0):
+        self.ids = ids
+        self.parents = parents
+        self.sizes = sizes
+        self.depths = depths
+        self.label_offsets = label_offsets
+        self.label_blob = label_blob
+        if positions is None:
+            self._build_index()
+        else:
+            self._positions, self._min_id = positions, min_id
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a CompactTree from flat (id, label, parent_id) rows in any order.
+
+        :param rows: Iterable of rows or objects with id, label and parent_id.
+        :return: CompactTree of every node reachable from a root.
+        """
+        in_ids, in_labels, in_parent_ids = [], [], []
+        for row in rows:
+            in_ids.append(row.id)
+            in_labels.append(row.label)
+            in_parent_ids.append(row.parent_id)
+        count = len(in_ids)
+        in_position = {node_id: i for i, node_id in enumerate(in_ids)}
+
+        # Children of every input row in CSR form (offsets + flat child list)
+        in_parents = array("q", [in_position.get(p, -2) if p is not None else -1 for p in in_parent_ids])
+        offsets = array("q", bytes(8 * (count + 1)))
+        for parent in in_parents:
+            if parent >= 0:
+                offsets[parent + 1] += 1
+        for i in range(count):
+            offsets[i + 1] += offsets[i]
+        children = array("q", bytes(8 * offsets[count]))
+        cursor = array("q", offsets)
+        for i, parent in enumerate(in_parents):
+            if parent >= 0:
+                children[cursor[parent]] = i
+                cursor[parent] += 1
+        del in_position, cursor
+
+        # Iterative pre-order walk from the roots, keeping input order among siblings
+        ids, parents, depths = array("q"), array("q"), array("l")
+        labels = []
+        stack = [(i, -1, 0) for i in reversed(range(count)) if in_parents[i] == -1]
+        while stack:
+            i, parent, depth = stack.pop()
+            position = len(ids)
+            ids.append(in_ids[i])
+            parents.append(parent)
+            depths.append(depth)
+            labels.append(in_labels[i].encode())
+            for j in range(offsets[i + 1] - 1, offsets[i] - 1, -1):
+                stack.append((children[j], position, depth + 1))
+
+        sizes = array("q", [1]) * len(ids)
+        for position in range(len(ids) - 1, 0, -1):
+            if parents[position] >= 0:
+                sizes[parents[position]] += sizes[position]
+
+        label_offsets = array("q", [0])
+        total = 0
+        for label in labels:
+            total += len(label)
+            label_offsets.append(total)
+        return cls(ids, parents, sizes, depths, label_offsets, b"".join(labels))
+
+    def _build_index(self):
+        """Builds the O(1) ID -> position lookup: a dense array when IDs are compact, else a dict."""
+        count = len(self.ids)
+        self._min_id = min(self.ids) if count else 0
+        span = (max(self.ids) - self._min_id + 1) if count else 0
+        if span <= 2 * count:
+            self._positions = array("q", [-1]) * span
+            for position, node_id in enumerate(self.ids):
+                self._positions[node_id - self._min_id] = position
+        else:
+            self._positions = {node_id: position for position, node_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index_of(self, node_id):
+        """Returns the position of node_id, or -1 if it is not in the tree."""
+        if isinstance(self._positions, dict):
+            return self._positions.get(node_id, -1)
+        offset = node_id - self._min_id
+        return self._positions[offset] if 0 <= offset < len(self._positions) else -1
+
+    def label(self, position):
+        """Returns the label of the node at position."""
+        return str(self.label_blob[self.label_offsets[position]:self.label_offsets[position + 1]], "utf-8")
+
+    def children(self, position):
+        """Yields the positions of the direct children of the node at position."""
+        child, end = position + 1, position + self.sizes[position]
+        while child < end:
+            yield child
+            child += self.sizes[child]
+
+    def roots(self):
+        """Yields the positions of the root nodes."""
+        root = 0
+        while root < len(self.ids):
+            yield root
+            root += self.sizes[root]
+
+    def subtree(self, node_id):
+        """Returns the range of positions in the subtree of node_id (empty if absent)."""
+        position = self.index_of(node_id)
+        return range(position, position + self.sizes[position]) if position >= 0 else range(0)
+
+    def depth(self, node_id):
+        """Returns the depth of node_id (0 for roots), or None if it is not in the tree."""
+        position = self.index_of(node_id)
+        return self.depths[position] if position >= 0 else None
+
+    def rows(self, positions=None):
+        """Yields (id, label, parent_id) in pre-order, for all nodes or the given positions."""
+        for position in positions if positions is not None else range(len(self.ids)):
+            parent = self.parents[position]
+            yield self.ids[position], self.label(position), self.ids[parent] if parent >= 0 else None
+
+    def to_nested(self, node_id=None):
+        """
+        Materializes the nested dict form produced by build_tree(), iteratively.
+
+        :param node_id: Optional subtree root.
+        :return: List of root dicts, or the subtree dict (None if absent) when node_id is given.
+        """
+        positions = self.subtree(node_id) if node_id is not None else range(len(self.ids))
+        result = []
+        open_nodes = []  # (end position, children list) of each open ancestor
+        for position in positions:
+            node = {"id": self.ids[position], "label": self.label(position), "children": []}
+            while open_nodes and position >= open_nodes[-1][0]:
+                open_nodes.pop()
+            (open_nodes[-1][1] if open_nodes else result).append(node)
+            open_nodes.append((position + self.sizes[position], node["children"]))
+
+        if node_id is not None:
+            return result[0] if result else None
+        return result
+
+    def nbytes(self):
+        """Returns the approximate memory held by the arrays, label blob and ID index."""
+        arrays = (self.ids, self.parents, self.sizes, self.depths, self.label_offsets)
+        total = sum(a.itemsize * len(a) for a in arrays) + len(self.label_blob)
+        if isinstance(self._positions, dict):
+            return total + sys.getsizeof(self._positions)
+        return total + self._positions.itemsize * len(self._positions)
+
+    def write_snapshot(self, file, generation, tree_version=0):
+        """
+        Writes the tree in a flat binary format that from_snapshot() maps without copying.
+
+        All arrays are stored as little-endian int64 (8-byte aligned), followed
+        by the label blob. A dense ID index is stored too, so readers skip
+        rebuilding it; a sparse (dict) index is rebuilt on load.
+
+        :param file: Binary file object open for writing.
+        :param generation: Snapshot generation (local write counter) the tree was loaded at.
+        :param tree_version: Shared tree version (see app.invalidation) the tree was loaded at.
+        """
+        dense_index = not isinstance(self._positions, dict)
+        index_length = len(self._positions) if dense_index else 0
+        file.write(self.SNAPSHOT_HEADER.pack(
+            self.SNAPSHOT_MAGIC, generation, tree_version, len(self.ids), len(self.label_blob), self._min_id,
+            index_length,
+        ))
+        arrays = [self.ids, self.parents, self.sizes, self.depths, self.label_offsets]
+        if dense_index:
+            arrays.append(self._positions)
+        for values in arrays:
+            if values.itemsize != 8 or sys.byteorder != "little":
+                values = array("q", values)
+                if sys.byteorder != "little":
+                    values.byteswap()
+            file.write(memoryview(values).cast("B"))
+        file.write(self.label_blob)
+
+    @classmethod
+    def read_snapshot_stamp(cls, buffer):
+        """Returns (generation, tree_version) stamped in a snapshot buffer, or None if it is not a snapshot."""
+        if len(buffer) < cls.SNAPSHOT_HEADER.size:
+            return None
+        magic, generation, tree_version, *_ = cls.SNAPSHOT_HEADER.unpack_from(buffer)
+        return (generation, tree_version) if magic == cls.SNAPSHOT_MAGIC else None
+
+    @classmethod
+    def from_snapshot(cls, buffer):
+        """
+        Builds a CompactTree backed directly by a snapshot buffer (e.g. an mmap), without copying.
+
+        Works on little-endian hosts, where the stored int64 arrays can be
+        viewed in place.
+
+        :param buffer: Bytes-like object holding a snapshot written by write_snapshot().
+        :return: The CompactTree; its arrays are memoryviews into buffer.
+        :raises ValueError: If buffer is not a snapshot.
+        """
+        if cls.read_snapshot_stamp(buffer) is None:
+            raise ValueError("Not a tree snapshot")
+        _, _, _, count, label_bytes, min_id, index_length = cls.SNAPSHOT_HEADER.unpack_from(buffer)
+        view = memoryview(buffer)
+        offset = cls.SNAPSHOT_HEADER.size
+
+        def take(length):
+            nonlocal offset
+            values = view[offset:offset + 8 * length].cast("q")
+            offset += 8 * length
+            return values
+
+        ids, parents, sizes, depths = take(count), take(count), take(count), take(count)
+        label_offsets = take(count + 1)
+        positions = take(index_length) if index_length else None
+        label_blob = view[offset:offset + label_bytes]
+        return cls(ids, parents, sizes, depths, label_offsets, label_blob, positions=positions, min_id=min_id)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Materialized path helpers
+# ─────────────────────────────────────────────────────────────────────────────
+def node_path(parent_path, node_id):
     """
-    visited = set()
-    stack = [ancestor_id]
+    Builds the materialized path of a node from its parent's path.
 
+    :param parent_path: Path of the parent node, or None for a root node.
+    :param node_id: ID of the node.
+    :return: Path string such as "/1/5/9/".
+    """
+    return f"{parent_path or '/'}{node_id}/"
+
+
+def path_upper_bound(path):
+    """
+    Returns the exclusive upper bound of the path range covering a subtree.
+
+    Every descendant path starts with `path`; replacing the trailing "/" with
+    "0" (the next character in byte order) gives the first string after them.
+
+    :param path: Path of the subtree root.
+    :return: Exclusive upper bound for a `path >= ... AND path < ...` scan.
+    """
+    return path[:-1] + "0"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Orders bulk-import items so every parent is created before its children
+# ─────────────────────────────────────────────────────────────────────────────
+def plan_bulk_levels(items):
+    """
+    Flattens bulk-import items and groups them into insertion levels.
+
+    Nested children are flattened iteratively. Level 0 holds items attached
+    to an existing node (parentId) or to nothing; level k+1 holds items whose
+    parent item is on level k. Items left over after leveling refer to an
+    unknown tempId or form a cycle.
+
+    :param items: List of TreeNodeBulkItem.
+    :return: List of levels, each a list of (key, item, parent_key) tuples, where
+             key is a unique int and parent_key is None for level-0 items.
+    :raises InvalidParentIDException: On duplicate or unknown tempIds, or cycles.
+    """
+    flat = []
+    key_by_temp_id = {}
+    stack = [(item, None) for item in reversed(items)]
     while stack:
-        current = stack.pop()
-        if current in visited:
+        item, nested_parent_key = stack.pop()
+        key = len(flat)
+        if item.tempId is not None:
+            if item.tempId in key_by_temp_id:
+                raise InvalidParentIDException(f"tempId {item.tempId!r} (duplicate)")
+            key_by_temp_id[item.tempId] = key
+        flat.append((key, item, nested_parent_key))
+        stack.extend((child, key) for child in reversed(item.children))
+
+    children_by_parent = defaultdict(list)
+    level = []
+    for key, item, nested_parent_key in flat:
+        parent_key = nested_parent_key
+        if item.parentTempId is not None:
+            if item.parentTempId not in key_by_temp_id:
+                raise InvalidParentIDException(f"tempId {item.parentTempId!r}")
+            parent_key = key_by_temp_id[item.parentTempId]
+        if parent_key is None:
+            level.append((key, item, None))
+        else:
+            children_by_parent[parent_key].append((key, item, parent_key))
+
+    levels = []
+    placed = 0
+    while level:
+        levels.append(level)
+        placed += len(level)
+        level = [entry for key, _, _ in level for entry in children_by_parent.get(key, [])]
+
+    if placed != len(flat):
+        raise InvalidParentIDException("tempId references (cycle detected)")
+    return levels
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Computes the materialized paths that result from a set of moves
+# ─────────────────────────────────────────────────────────────────────────────
+def resolve_moved_paths(moves, old_paths):
+    """
+    Computes the final path of every given node after applying all moves at once.
+
+    A moved node's final path is its new parent's final path plus its own ID.
+    Any other node keeps its path relative to its nearest moved ancestor (or
+    its old path if it has none). Resolution is iterative, and a node that
+    ends up depending on itself means the moves would create a cycle.
+
+    :param moves: {node_id: new_parent_id} for every moved node.
+    :param old_paths: {node_id: path} covering the moved nodes, their new parents,
+                      and every node whose final path is wanted.
+    :return: {node_id: final_path} for every node in old_paths.
+    :raises InvalidParentIDException: If the moves would create a cycle.
+    """
+    def dependency(node_id):
+        """Returns (node whose final path comes first, suffix to append), or (None, None)."""
+        if node_id in moves:
+            return moves[node_id], f"{node_id}/"
+        path = old_paths[node_id]
+        ancestor_ids = path.strip("/").split("/")[:-1]
+        for ancestor_id in reversed(ancestor_ids):
+            if int(ancestor_id) in moves:
+                return int(ancestor_id), path[path.index(f"/{ancestor_id}/") + len(ancestor_id) + 2:]
+        return None, None
+
+    final_paths = {}
+    for start_id in old_paths:
+        if start_id in final_paths:
             continue
-        visited.add(current)
+        stack = [start_id]
+        on_stack = {start_id}
+        while stack:
+            node_id = stack[-1]
+            depends_on, suffix = dependency(node_id)
+            if depends_on is None:
+                final_paths[node_id] = old_paths[node_id]
+            elif depends_on in final_paths:
+                final_paths[node_id] = final_paths[depends_on] + suffix
+            elif depends_on in on_stack:
+                raise InvalidParentIDException("Cannot set parentId to a descendant node.")
+            else:
+                stack.append(depends_on)
+                on_stack.add(depends_on)
+                continue
+            on_stack.discard(stack.pop())
+    return final_paths
 
-        result = await db.execute(
-            select(models.TreeNode.id).filter(models.TreeNode.parent_id == current)
-        )
-        child_ids = [row[0] for row in result.fetchall()]
 
-        if descendant_id in child_ids:
-            return True
+# ─────────────────────────────────────────────────────────────────────────────
+# Checks if a node is a descendant of another (async version)
+# ─────────────────────────────────────────────────────────────────────────────
+async def is_descendant(db: AsyncSession, descendant_id: int, ancestor_id: int) -> bool:
+    """
+    Checks if a node is a descendant of another to prevent cyclic parent-child relationships.
+
+    Walks *up* from descendant_id through its ancestors with a single recursive
+    query, so the cost is O(depth) and one round trip regardless of subtree size.
+    If the walk reaches MAX_TREE_DEPTH before a root, the answer cannot be
+    known, and True is returned so that callers refuse the move (a chain
+    that deep, or a cycle already in the data).
 
-        stack.extend(child_ids)
+    :param db: Async SQLAlchemy DB session.
+    :param descendant_id: Potential child node.
+    :param ancestor_id: Potential ancestor node.
+    :return: True if descendant_id is under ancestor_id, or the walk hit MAX_TREE_DEPTH.
+    """
+    ancestors = (
+        select(models.TreeNode.parent_id.label("id"), literal(1).label("depth"))
+        .where(models.TreeNode.id == descendant_id)
+        .cte(name="ancestors", recursive=True)
+    )
+    ancestors = ancestors.union_all(
+        select(models.TreeNode.parent_id, ancestors.c.depth + 1)
+        .where(models.TreeNode.id == ancestors.c.id)
+        .where(ancestors.c.depth < MAX_TREE_DEPTH)
+    )
 
-    return False
+    result = await db.execute(
+        select(ancestors.c.id)
+        .where(or_(
+            ancestors.c.id == ancestor_id,
+            and_(ancestors.c.depth >= MAX_TREE_DEPTH, ancestors.c.id.is_not(None)),
+        ))
+        .limit(1)
+    )
+    return result.first() is not None
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Recursively locate and return the subtree rooted at a specific node ID
+# Locate and return the subtree rooted at a specific node ID
 # ─────────────────────────────────────────────────────────────────────────────
 def find_subtree_by_id(tree, target_id):
     """
-    Recursively locate and return the subtree rooted at a specific node ID.
+    Locate and return the subtree rooted at a specific node ID.
 
     This function walks through the tree structure, which is a list of nested dictionaries
     (each representing a node with potential children), and returns the first match found
-    based on the target_id.
+    based on the target_id. The walk is iterative, so deep trees cannot exhaust the
+    recursion limit. It is O(n); prefer the index returned by build_tree() when available.
 
     Parameters:
-        tree (list[dict]): The tree structure to search, typically the result of build_tree().
+        tree (list[dict]): The tree structure to search, typically the roots from build_tree().
         target_id (int): The ID of the node to locate in the tree.
 
     Returns:
         dict: The subtree rooted at the matching node.
         None: If no matching node is found in the tree.
     """
-    for node in tree:
+    stack = list(reversed(tree))
+    while stack:
+        node = stack.pop()
         if node["id"] == target_id:
             return node
-        child = find_subtree_by_id(node["children"], target_id)
-        if child:
-            return child
+        stack.extend(reversed(node["children"]))
     return None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Iterative JSON encoder for nested trees
+# ─────────────────────────────────────────────────────────────────────────────
+def encode_tree_json(tree) -> bytes:
+    """
+    Encode a build_tree()-style nested tree as compact JSON, without recursion.
+
+    Produces the same JSON as serializing the tree through TreeNodeResponse
+    (same key order; hasChildren/childCount only where present), but works
+    for trees of any depth, where recursive encoders and validators fail.
+
+    Parameters:
+        tree (list[dict] | dict): Root nodes, or a single subtree.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    single = isinstance(tree, dict)
+    parts = [] if single else ["["]
+    stack = [(iter([tree] if single else tree), None)]
+    first = True
+
+    while stack:
+        siblings, owner = stack[-1]
+        node = next(siblings, None)
+        if node is None:
+            stack.pop()
+            if owner is not None:
+                parts.append("]")
+                if "hasChildren" in owner:
+                    has_children = "true" if owner["hasChildren"] else "false"
+                    parts.append(f',"hasChildren":{has_children},"childCount":{owner["childCount"]}')
+                parts.append("}")
+            first = False
+            continue
+
+        if not first:
+            parts.append(",")
+        parts.append(f'{{"id":{node["id"]},"label":{json.dumps(node["label"], ensure_ascii=False)},"children":[')
+        stack.append((iter(node["children"]), node))
+        first = True
+
+    if not single:
+        parts.append("]")
+    return "".join(parts).encode()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Incremental encoders for streaming tree exports
+# ─────────────────────────────────────────────────────────────────────────────
+async def encode_ndjson(batches):
+    """
+    Encode batches of flat node rows as newline-delimited JSON.
+
+    Parameters:
+        batches (AsyncIterator[list]): Batches of (id, label, parent_id) rows.
+
+    Yields:
+        bytes: One chunk per batch, one JSON object per line.
+    """
+    async for batch in batches:
+        yield "".join(
+            json.dumps({"id": node_id, "label": label, "parentId": parent_id}, ensure_ascii=False) + "\n"
+            for node_id, label, parent_id in batch
+        ).encode()
+
+
+async def encode_nested_json(batches, prefix: str = "", suffix: str = ""):
+    """
+    Encode depth-first ordered node rows as a nested JSON array, incrementally.
+
+    Rows must arrive in pre-order (every node after its parent, subtrees
+    contiguous). Only the chain of currently open ancestors is kept in
+    memory, and no recursion is used, so arbitrarily deep trees are safe.
+
+    Parameters:
+        batches (AsyncIterator[list]): Batches of (id, label, parent_id) rows in pre-order.
+        prefix (str): Text emitted before the array (e.g. an enclosing object).
+        suffix (str): Text emitted after the array.
+
+    Yields:
+        bytes: One chunk per batch, plus the closing chunk.
+    """
+    open_ids = []
+    after_close = False
+    first_chunk = prefix + "["
+
+    async for batch in batches:
+        parts = [first_chunk]
+        first_chunk = ""
+        for node_id, label, parent_id in batch:
+            # Close every open node that is not the parent of this row
+            while open_ids and open_ids[-1] != parent_id:
+                open_ids.pop()
+                parts.append("]}")
+                after_close = True
+            if after_close:
+                parts.append(",")
+            parts.append(f'{{"id":{node_id},"label":{json.dumps(label, ensure_ascii=False)},"children":[')
+            open_ids.append(node_id)
+            after_close = False
+        yield "".join(parts).encode()
+
+    yield (first_chunk + "]}" * len(open_ids) + "]" + suffix).encode()
@@ -0,0 +1,77 @@
+# benchmarks/bench_child_lookup.py
+#
+# Measures child-lookup latency on the nodes table with and without the
+# (parent_id, id) index.
+#
+# Usage:
+#     APP_ENV=local python -m benchmarks.bench_child_lookup [--rows 1000000] [--lookups 200]
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import create_engine, select, insert
+from app.database import Base
+from app import models
+
+INDEX_NAME = "ix_nodes_parent_id_id"
+
+
+def populate(engine, rows: int, fanout: int = 10):
+    """Inserts a balanced tree of `rows` nodes where node i's parent is (i - 2) // fanout + 1."""
+    table = models.TreeNode.__table__
+    batch = []
+    with engine.begin() as conn:
+        for node_id in range(1, rows + 1):
+            parent_id = None if node_id == 1 else (node_id - 2) // fanout + 1
+            batch.append({"id": node_id, "label": f"node-{node_id}", "parent_id": parent_id})
+            if len(batch) == 50000:
+                conn.execute(insert(table), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(table), batch)
+
+
+def time_lookups(engine, parent_ids) -> float:
+    """Returns the mean latency in milliseconds of an ordered child lookup."""
+    table = models.TreeNode.__table__
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        for parent_id in parent_ids:
+            conn.execute(
+                select(table.c.id, table.c.label).where(table.c.parent_id == parent_id).order_by(table.c.id)
+            ).all()
+        elapsed = time.perf_counter() - start
+    return elapsed / len(parent_ids) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Child lookup latency with and without the parent_id index")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        populate(engine, args.rows)
+
+        random.seed(0)
+        parent_ids = [random.randint(1, args.rows // 10) for _ in range(args.lookups)]
+
+        index = next(i for i in models.TreeNode.__table__.indexes if i.name == INDEX_NAME)
+        index.drop(engine)
+        without_index = time_lookups(engine, parent_ids)
+        index.create(engine)
+        with_index = time_lookups(engine, parent_ids)
+        engine.dispose()
+
+    print(f"rows={args.rows} lookups={args.lookups}")
+    print(f"child lookup without index: {without_index:.3f} ms")
+    print(f"child lookup with index:    {with_index:.3f} ms")
+    print(f"speedup: {without_index / with_index:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
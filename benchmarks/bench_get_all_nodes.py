@@ -0,0 +1,83 @@
+# benchmarks/bench_get_all_nodes.py
+#
+# Compares the full-tree read path before and after the lean loader:
+# ORM entities with selectinload(children) versus (id, label, parent_id) rows,
+# each followed by build_tree. Reports wall time and peak traced memory.
+#
+# Usage:
+#     APP_ENV=local python -m benchmarks.bench_get_all_nodes [--rows 100000 1000000]
+
+import argparse
+import asyncio
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import configure_mappers, sessionmaker, selectinload
+from app.database import Base
+from app import crud, models
+from app.utils import build_tree
+from benchmarks.bench_child_lookup import populate
+
+# Sets up the `children` backref, which is otherwise created on first use
+configure_mappers()
+
+
+async def orm_entities_loader(db: AsyncSession):
+    """The previous get_all_nodes: full entities plus an eager children query."""
+    result = await db.execute(select(models.TreeNode).options(selectinload(models.TreeNode.children)))
+    return result.scalars().all()
+
+
+async def measure(session_factory, loader) -> tuple[float, float]:
+    """
+    Returns (seconds, peak MiB) for load + build_tree in a fresh session.
+
+    Time is taken from an untraced run, since tracemalloc slows allocation.
+    """
+    async def load_and_build():
+        async with session_factory() as db:
+            return build_tree(await loader(db))[0]
+
+    gc.collect()
+    start = time.perf_counter()
+    await load_and_build()
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    await load_and_build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+async def run(rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        sync_engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(sync_engine)
+        populate(sync_engine, rows)
+        sync_engine.dispose()
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        for name, loader in (("orm entities + selectinload", orm_entities_loader), ("lean rows", crud.get_all_nodes)):
+            elapsed, peak = await measure(session_factory, loader)
+            print(f"rows={rows:<8} {name:<28} {elapsed:8.2f} s  peak {peak:8.1f} MiB")
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-tree load latency and memory, ORM entities vs lean rows")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+    for rows in args.rows:
+        asyncio.run(run(rows))
+
+
+if __name__ == "__main__":
+    main()
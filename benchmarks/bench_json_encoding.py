@@ -0,0 +1,70 @@
+# benchmarks/bench_json_encoding.py
+#
+# Compares CPU time per tree response for the three ways of encoding it:
+# validating through schemas.ResponseWrapper (the original path), the
+# iterative builtin encoder, and orjson (TREE_JSON_ENCODER=orjson).
+#
+# Usage:
+#     APP_ENV=local python -m benchmarks.bench_json_encoding [--rows 10000 100000] [--repeat 5]
+
+import argparse
+import json
+import time
+from app import schemas
+from app.api import tree as tree_api
+from app.utils import build_tree
+from benchmarks.bench_tree_memory import make_rows
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def pydantic_encoder(payload):
+    """The original path: validate the nested tree, then dump it."""
+    return schemas.ResponseWrapper.model_validate(payload).model_dump_json().encode()
+
+
+def builtin_encoder(payload):
+    tree_api.USE_ORJSON = False
+    return tree_api.encode_response(payload)
+
+
+def orjson_encoder(payload):
+    tree_api.USE_ORJSON = True
+    return tree_api.encode_response(payload)
+
+
+def cpu_ms(encode, payload, repeat: int) -> float:
+    """Returns the best CPU time in milliseconds over `repeat` encodings."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        encode(payload)
+        best = min(best, time.process_time() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU per tree response: pydantic vs builtin vs orjson encoding")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    encoders = [("pydantic ResponseWrapper", pydantic_encoder), ("builtin iterative", builtin_encoder)]
+    if orjson is not None:
+        encoders.append(("orjson", orjson_encoder))
+
+    for rows in args.rows:
+        roots, _ = build_tree(make_rows(rows))
+        payload = {"code": 200, "message": "Tree retrieved successfully", "data": roots}
+
+        expected = json.loads(pydantic_encoder(payload))
+        for name, encode in encoders:
+            assert json.loads(encode(payload)) == expected, f"{name} changed the JSON contract"
+            print(f"rows={rows:<8} {name:<26} {cpu_ms(encode, payload, args.repeat):9.1f} ms CPU")
+
+
+if __name__ == "__main__":
+    main()
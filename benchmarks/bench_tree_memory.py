@@ -0,0 +1,63 @@
+# benchmarks/bench_tree_memory.py
+#
+# Measures memory retained per node by the nested dict tree (build_tree)
+# versus the array-backed CompactTree, for the same synthetic rows.
+#
+# Usage:
+#     APP_ENV=local python -m benchmarks.bench_tree_memory [--rows 1000000]
+
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import namedtuple
+from app.utils import CompactTree, build_tree
+
+Row = namedtuple("Row", "id label parent_id")
+
+
+def make_rows(count: int, fanout: int = 10):
+    """Synthetic balanced tree rows; node i's parent is (i - 2) // fanout + 1."""
+    return [
+        Row(node_id, f"node-{node_id}", None if node_id == 1 else (node_id - 2) // fanout + 1)
+        for node_id in range(1, count + 1)
+    ]
+
+
+def retained(build, rows):
+    """
+    Returns (seconds, bytes still allocated after build) for build(rows).
+
+    Time is taken from an untraced run, since tracemalloc slows allocation.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    build(rows)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    result = build(rows)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-node memory of build_tree vs CompactTree")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    for name, build in (("build_tree (dicts)", build_tree), ("CompactTree", CompactTree.from_rows)):
+        elapsed, current = retained(build, rows)
+        print(f"rows={args.rows:<8} {name:<20} {current / args.rows:7.1f} B/node  build {elapsed:6.2f} s")
+
+    compact = CompactTree.from_rows(rows)
+    print(f"CompactTree.nbytes(): {compact.nbytes() / args.rows:.1f} B/node")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/generators.py
+#
+# Synthetic tree generators shared by the benchmarks. Every shape yields
+# (id, label, parent_id, path) rows with parents before children, and
+# ids from 1 to count, so the same rows can feed build_tree/CompactTree
+# directly or be written into a database with populate_sqlite().
+
+import random
+from collections import namedtuple
+from sqlalchemy import create_engine, insert
+from app.database import Base
+from app import models
+from app.utils import node_path
+
+Row = namedtuple("Row", "id label parent_id path")
+
+SHAPES = ("balanced", "wide", "deep", "skewed")
+
+# Length of each chain in the "deep" shape; deeper than Python's default recursion limit
+DEEP_CHAIN_LENGTH = 1200
+
+
+def _parent_ids(shape: str, count: int, fanout: int, chain_length: int, seed: int):
+    """Yields the parent ID of nodes 1..count for the given shape."""
+    rng = random.Random(seed)
+    for node_id in range(1, count + 1):
+        if shape == "balanced":
+            # Every node has `fanout` children, level by level
+            yield None if node_id == 1 else (node_id - 2) // fanout + 1
+        elif shape == "wide":
+            # One root with every other node as its direct child
+            yield None if node_id == 1 else 1
+        elif shape == "deep":
+            # Chains of chain_length nodes, each starting at a new root
+            yield None if (node_id - 1) % chain_length == 0 else node_id - 1
+        elif shape == "skewed":
+            # Preferential attachment: early nodes collect most of the children
+            yield None if node_id == 1 else 1 + int((node_id - 1) * rng.random() ** 3)
+        else:
+            raise ValueError(f"Unknown tree shape {shape!r}; expected one of {', '.join(SHAPES)}")
+
+
+def generate_rows(
+    shape: str,
+    count: int,
+    fanout: int = 10,
+    chain_length: int = DEEP_CHAIN_LENGTH,
+    seed: int = 0,
+) -> list[Row]:
+    """
+    Generates a synthetic tree of `count` nodes.
+
+    Parameters:
+        shape (str): "balanced" (fixed fanout), "wide" (one root, flat),
+            "deep" (chains of chain_length) or "skewed" (few nodes with most children).
+        count (int): Number of nodes.
+        fanout (int): Children per node for the balanced shape.
+        chain_length (int): Nodes per chain for the deep shape.
+        seed (int): Random seed for the skewed shape.
+
+    Returns:
+        list[Row]: Rows ordered by id, each parent before its children.
+    """
+    rows = []
+    for node_id, parent_id in enumerate(_parent_ids(shape, count, fanout, chain_length, seed), start=1):
+        parent_path = rows[parent_id - 1].path if parent_id else None
+        rows.append(Row(node_id, f"{shape}-{node_id}", parent_id, node_path(parent_path, node_id)))
+    return rows
+
+
+def populate_sqlite(db_file: str, rows: list[Row], batch_size: int = 50000):
+    """
+    Creates the schema in a SQLite file and inserts the rows.
+
+    Parameters:
+        db_file (str): Path of the SQLite database file.
+        rows (list[Row]): Rows from generate_rows().
+        batch_size (int): Rows per executemany INSERT.
+    """
+    engine = create_engine(f"sqlite:///{db_file}")
+    Base.metadata.create_all(engine)
+    table = models.TreeNode.__table__
+    with engine.begin() as conn:
+        for start in range(0, len(rows), batch_size):
+            conn.execute(insert(table), [row._asdict() for row in rows[start:start + batch_size]])
+        conn.execute(insert(models.tree_version).values(version=0))
+    engine.dispose()
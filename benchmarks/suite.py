@@ -0,0 +1,272 @@
+# benchmarks/suite.py
+#
+# Self-contained benchmark suite: generates synthetic trees of several
+# shapes and sizes into a throwaway SQLite database and times the tree
+# utilities, the CRUD functions and the HTTP endpoints (through an
+# in-process ASGI client, no server needed). Results are written as JSON,
+# and can be compared against a previous run to catch regressions.
+#
+# Usage:
+#     python -m benchmarks.suite [--shapes balanced wide deep skewed] [--sizes 1000 10000 100000]
+#                                [--output results.json] [--baseline previous.json --threshold 0.25]
+
+import os
+import tempfile
+
+# The app's engine is created at import time, so point it at the benchmark database first
+_BENCH_DIR = tempfile.mkdtemp(prefix="treeapi-bench-")
+_BENCH_DB = os.path.join(_BENCH_DIR, "bench.db")
+os.environ["APP_ENV"] = "local"
+os.environ["SQLITE_URL"] = f"sqlite+aiosqlite:///{_BENCH_DB}"
+os.environ.setdefault("REPLICA_URLS", "")
+
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import httpx
+from app import crud, schemas
+from app.cache import tree_cache
+from app.database import AsyncSessionLocal, engine
+from app.main import app
+from app.utils import CompactTree, build_tree, encode_tree_json, find_subtree_by_id, is_descendant
+from benchmarks.generators import SHAPES, generate_rows, populate_sqlite
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Timing
+# ─────────────────────────────────────────────────────────────────────────────
+async def measure(fn, iterations: int, time_budget: float, setup=None) -> dict:
+    """
+    Times fn() (sync or async) repeatedly and summarizes the latencies.
+
+    Runs up to `iterations` times, but stops early once `time_budget` seconds
+    have been spent (after at least one run), so large trees stay bounded.
+
+    Parameters:
+        fn (Callable): The operation to time.
+        iterations (int): Maximum number of runs.
+        time_budget (float): Time budget in seconds after which no new run starts.
+        setup (Callable | None): Untimed step before every run (e.g. cache invalidation).
+
+    Returns:
+        dict: iterations, mean_ms, median_ms, p95_ms and min_ms.
+    """
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < iterations and (not samples or time.perf_counter() - started < time_budget):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        if inspect.isawaitable(result):
+            await result
+        samples.append((time.perf_counter() - start) * 1000)
+
+    ordered = sorted(samples)
+    return {
+        "iterations": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "min_ms": round(ordered[0], 4),
+    }
+
+
+def _ancestor_root(rows, node_id: int) -> int:
+    """Returns the root above node_id, walking parent links in the generated rows."""
+    while rows[node_id - 1].parent_id is not None:
+        node_id = rows[node_id - 1].parent_id
+    return node_id
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Benchmarks for one generated tree
+# ─────────────────────────────────────────────────────────────────────────────
+async def run_dataset(shape: str, count: int, args) -> list[dict]:
+    """Generates one tree into the benchmark database and runs every benchmark on it."""
+    rows = generate_rows(shape, count)
+    await engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(_BENCH_DB + suffix):
+            os.remove(_BENCH_DB + suffix)
+    populate_sqlite(_BENCH_DB, rows)
+    tree_cache.invalidate()
+
+    leaf = count
+    root = _ancestor_root(rows, leaf)
+    target = rows[count // 2].id
+    results = []
+
+    async def bench(group: str, name: str, fn, setup=None, iterations=None):
+        stats = await measure(fn, iterations or args.iterations, args.time_budget, setup)
+        results.append({"shape": shape, "nodes": count, "group": group, "name": name, **stats})
+        print(f"{shape:<9} {count:>8} {group:<9} {name:<34} median {stats['median_ms']:10.3f} ms"
+              f"  p95 {stats['p95_ms']:10.3f} ms  (n={stats['iterations']})")
+
+    # Pure tree utilities on the in-memory rows
+    roots, _ = build_tree(rows)
+    await bench("utils", "build_tree", lambda: build_tree(rows))
+    await bench("utils", "CompactTree.from_rows", lambda: CompactTree.from_rows(rows))
+    # roots is bound as a default so it can be freed before the database benchmarks
+    await bench("utils", "find_subtree_by_id", lambda roots=roots: find_subtree_by_id(roots, target))
+    await bench("utils", "encode_tree_json", lambda roots=roots: encode_tree_json(roots))
+    del roots
+
+    # CRUD functions against the database
+    async with AsyncSessionLocal() as db:
+        await bench("crud", "is_descendant (leaf, root)", lambda: is_descendant(db, leaf, root))
+        await bench("crud", "get_all_nodes", lambda: crud.get_all_nodes(db))
+        await bench("crud", "get_subtree_nodes", lambda: crud.get_subtree_nodes(db, target))
+        await bench("crud", "get_tree_levels (depth 2)", lambda: crud.get_tree_levels(db, 2))
+        await bench("crud", "get_children_page (50)", lambda: crud.get_children_page(db, root, 50))
+        await bench("crud", "get_node_by_id", lambda: crud.get_node_by_id(db, target))
+
+        created = []
+
+        async def create():
+            created.append((await crud.create_node(db, schemas.TreeNodeCreate(label="bench", parentId=target))).id)
+
+        await bench("crud", "create_node", create)
+        await bench("crud", "update_node (relabel)",
+                    lambda: crud.update_node(db, target, schemas.TreeNodeCreate(label="bench-relabel", parentId=rows[target - 1].parent_id)))
+        moves = iter(range(1, 10 ** 9))
+        await bench("crud", "update_node (move leaf)",
+                    lambda: crud.update_node(db, leaf, schemas.TreeNodeCreate(label="bench-move", parentId=root if next(moves) % 2 else target)))
+        await bench("crud", "delete_node_by_id", lambda: crud.delete_node_by_id(db, created.pop()),
+                    iterations=min(args.iterations, len(created)))
+
+        bulk = schemas.TreeNodeBulkCreate(nodes=[
+            {"tempId": "b", "label": "bench-bulk", "parentId": target,
+             "children": [{"tempId": f"b{i}", "label": f"bench-bulk-{i}"} for i in range(99)]}
+        ])
+        bulk_roots = []
+
+        async def bulk_create():
+            bulk_roots.append((await crud.bulk_create_nodes(db, bulk)).idMap["b"])
+
+        await bench("crud", "bulk_create_nodes (100)", bulk_create)
+        relabel = schemas.TreeNodeBatchUpdate(updates=[{"id": node_id, "label": "bench-batch"} for node_id in range(1, min(count, 100) + 1)])
+        await bench("crud", "batch_update_nodes (100 labels)", lambda: crud.batch_update_nodes(db, relabel))
+        await bench("crud", "delete_subtree (100)", lambda: crud.delete_subtree(db, bulk_roots.pop()),
+                    iterations=min(args.iterations, len(bulk_roots)))
+
+    # HTTP endpoints through the ASGI app, in process
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def get(url):
+            response = await client.get(url)
+            response.raise_for_status()
+
+        await bench("endpoint", "GET /api/tree (cold)", lambda: get("/api/tree"), setup=tree_cache.invalidate)
+        await bench("endpoint", "GET /api/tree (cached)", lambda: get("/api/tree"))
+        await bench("endpoint", "GET /api/tree?depth=2 (cold)", lambda: get("/api/tree?depth=2"), setup=tree_cache.invalidate)
+        await bench("endpoint", "GET /api/tree/{id} (cold)", lambda: get(f"/api/tree/{target}"), setup=tree_cache.invalidate)
+        await bench("endpoint", "GET /api/tree/{id}/children", lambda: get(f"/api/tree/{root}/children"))
+        await bench("endpoint", "GET /api/tree/export (ndjson)", lambda: get("/api/tree/export"))
+
+        created = []
+
+        async def post():
+            response = await client.post("/api/tree", json={"label": "bench", "parentId": target})
+            created.append(response.json()["data"]["id"])
+
+        await bench("endpoint", "POST /api/tree", post)
+        await bench("endpoint", "PUT /api/tree/{id}",
+                    lambda: client.put(f"/api/tree/{target}", json={"label": "bench-put", "parentId": rows[target - 1].parent_id}))
+        await bench("endpoint", "DELETE /api/tree/{id}", lambda: client.delete(f"/api/tree/{created.pop()}"),
+                    iterations=min(args.iterations, len(created)))
+
+    return results
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Regression check against a previous run
+# ─────────────────────────────────────────────────────────────────────────────
+def find_regressions(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    """
+    Lists benchmarks whose median is more than `threshold` slower than in the baseline.
+
+    Parameters:
+        results (list[dict]): Results of this run.
+        baseline (dict): A previous JSON report of this suite.
+        threshold (float): Allowed relative slowdown, e.g. 0.25 for 25%.
+
+    Returns:
+        list[str]: One description per regression.
+    """
+    previous = {(r["shape"], r["nodes"], r["name"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["shape"], result["nodes"], result["name"]))
+        if before and result["median_ms"] > before["median_ms"] * (1 + threshold):
+            regressions.append(
+                f"{result['shape']} {result['nodes']} {result['name']}: "
+                f"{before['median_ms']:.3f} ms -> {result['median_ms']:.3f} ms"
+            )
+    return regressions
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> list[dict]:
+    results = []
+    for shape in args.shapes:
+        for count in args.sizes:
+            results.extend(await run_dataset(shape, count, args))
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tree API benchmark suite on synthetic trees")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=20, help="maximum runs per benchmark")
+    parser.add_argument("--time-budget", type=float, default=2.0, help="seconds after which a benchmark stops repeating")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed median slowdown vs. baseline")
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(_BENCH_DIR, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()